@@ -0,0 +1,101 @@
+"""
+Responde un fichero JSONL de preguntas desde la línea de comandos, sin Streamlit
+
+Uso:
+    python ask.py preguntas.jsonl --document informe.pdf --concurrency 8 --output respuestas.jsonl
+    python ask.py preguntas.jsonl --index informe.pdf      # indexa el archivo antes de preguntar
+
+Cada línea de entrada es un objeto JSON con "question" y, opcionalmente,
+"id" y "documents" (nombres o hashes; por defecto los de --document, o
+todos los del almacén). Cada línea de salida lleva la pregunta, la
+respuesta, el error si lo hubo, las fuentes y los tiempos por etapa.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from services.service_registry import registry
+from services.qa_service import answer_to_dict
+
+
+def read_questions(path):
+    """Lee las preguntas del JSONL (se aceptan también líneas de texto plano)"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if line.startswith("{") else {"question": line}
+            items.append(item)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Responde preguntas de un JSONL sobre documentos indexados")
+    parser.add_argument("questions", help="Fichero JSONL de preguntas")
+    parser.add_argument("--document", action="append", default=[], help="Nombre o hash de un documento (repetible)")
+    parser.add_argument("--index", action="append", default=[], help="Archivo a indexar antes de preguntar (repetible)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Preguntas en curso a la vez")
+    parser.add_argument("--output", help="Fichero JSONL de respuestas (por defecto, salida estándar)")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de respuestas")
+    args = parser.parse_args()
+
+    items = read_questions(args.questions)
+    if not items:
+        print("No hay preguntas en el fichero", file=sys.stderr)
+        return 1
+
+    qa_service = registry.get_qa_service()
+
+    documents = list(args.document)
+    for path in args.index:
+        with open(path, "rb") as file:
+            result = qa_service.index_file(file, os.path.basename(path))
+        print(f"[{result.status}] {result.file_name}", file=sys.stderr)
+        if result.status == "error":
+            print(result.error, file=sys.stderr)
+            return 1
+        documents.append(result.file_hash)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    done = 0
+
+    def write(index, result):
+        # Se escribe cada respuesta en cuanto termina (con su id para poder reordenar)
+        nonlocal done
+        row = answer_to_dict(result)
+        row["id"] = items[index].get("id", index)
+        output.write(json.dumps(row, ensure_ascii=False) + "\n")
+        output.flush()
+        done += 1
+        print(f"{done}/{len(items)} respuestas", file=sys.stderr, end="\r")
+
+    start = time.perf_counter()
+    try:
+        results = asyncio.run(qa_service.ask_many(
+            items, documents=documents, concurrency=args.concurrency,
+            use_cache=not args.no_cache, callback=write
+        ))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    errors = [r for r in results if r.error]
+    latencies = [r.timings["total"] for r in results if not r.error]
+    print(f"\n{len(results)} preguntas en {elapsed:.1f}s ({len(results) / elapsed:.1f}/s), "
+          f"{sum(r.from_cache for r in results)} desde caché, {len(errors)} con error", file=sys.stderr)
+    if latencies:
+        print(f"Latencia p50 {np.percentile(latencies, 50):.2f}s, p95 {np.percentile(latencies, 95):.2f}s",
+              file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Informe recall vs latencia del índice IVF frente a la búsqueda exacta
+
+Uso:
+    python -m benchmarks.ann_recall                      # datos sintéticos
+    python -m benchmarks.ann_recall --vectors 200000 --nlist 256 1024 --nprobe 4 8 16 32
+    python -m benchmarks.ann_recall --from-store         # embeddings reales de VECTOR_STORE_PATH
+
+Con el resultado se eligen IVF_NLIST e IVF_NPROBE en config/settings.py.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from services.ann_index import IVFIndex
+from services.vector_index import NumpyVectorIndex
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Vectores agrupados en temas, parecidos a embeddings de documentos reales
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def store_vectors(store_path: str) -> np.ndarray:
+    """
+    Une los índices NumPy ya guardados en el almacén (VECTOR_BACKEND = "numpy")
+    """
+    paths = sorted(glob.glob(os.path.join(store_path, "numpy_index", "*.npy")))
+    if not paths:
+        raise SystemExit(f"No hay índices NumPy en {store_path}; usa VECTOR_BACKEND=numpy y haz alguna consulta")
+    return np.concatenate([np.load(path) for path in paths])
+
+
+def time_queries(search, queries: np.ndarray) -> list:
+    """
+    Ejecuta una búsqueda por consulta y devuelve las latencias en milisegundos
+    """
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run(args) -> tuple:
+    if args.from_store:
+        from config.settings import settings
+        vectors = store_vectors(settings.VECTOR_STORE_PATH)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, args.clusters, args.seed)
+    
+    rng = np.random.default_rng(args.seed + 1)
+    query_rows = rng.choice(len(vectors), args.queries, replace=False)
+    queries = vectors[query_rows] + 0.1 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32)
+    
+    ids = [str(i) for i in range(len(vectors))]
+    exact = NumpyVectorIndex(vectors, ids, ids)
+    truth, _ = exact.search(queries, args.k)
+    exact_latencies = time_queries(lambda q: exact.search(q, args.k), queries)
+    exact_p50 = float(np.percentile(exact_latencies, 50))
+    
+    rows = [{
+        "mode": "exact", "nlist": None, "nprobe": None, "build_s": 0.0,
+        "recall": 1.0, "p50_ms": exact_p50,
+        "p95_ms": float(np.percentile(exact_latencies, 95)), "speedup": 1.0
+    }]
+    
+    for nlist in args.nlist:
+        start = time.perf_counter()
+        ivf = IVFIndex(vectors, nlist=nlist, seed=args.seed)
+        build_s = time.perf_counter() - start
+        
+        for nprobe in args.nprobe:
+            found, _ = ivf.search(queries, args.k, nprobe=nprobe)
+            recall = np.mean([
+                len(set(found_row) & set(truth_row)) / len(truth_row)
+                for found_row, truth_row in zip(found, truth)
+            ])
+            latencies = time_queries(lambda q: ivf.search(q, args.k, nprobe=nprobe), queries)
+            p50 = float(np.percentile(latencies, 50))
+            rows.append({
+                "mode": "ivf", "nlist": ivf.nlist, "nprobe": nprobe, "build_s": build_s,
+                "recall": float(recall), "p50_ms": p50,
+                "p95_ms": float(np.percentile(latencies, 95)), "speedup": exact_p50 / p50 if p50 else 0.0
+            })
+    
+    return rows, len(vectors)
+
+
+def print_report(rows: list, n: int, k: int) -> None:
+    print(f"\nRecall@{k} vs latencia ({n} vectores)\n")
+    print(f"{'modo':<6} {'nlist':>6} {'nprobe':>6} {'build(s)':>9} {'recall':>7} {'p50(ms)':>8} {'p95(ms)':>8} {'x exacta':>8}")
+    for row in rows:
+        print(
+            f"{row['mode']:<6} {row['nlist'] or '-':>6} {row['nprobe'] or '-':>6} "
+            f"{row['build_s']:>9.2f} {row['recall']:>7.3f} {row['p50_ms']:>8.3f} "
+            f"{row['p95_ms']:>8.3f} {row['speedup']:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latencia del índice IVF")
+    parser.add_argument("--vectors", type=int, default=50000, help="Vectores sintéticos")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensión (384 = all-MiniLM-L6-v2)")
+    parser.add_argument("--clusters", type=int, default=200, help="Temas de los datos sintéticos")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, nargs="+", default=[0], help="0 = automático")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--from-store", action="store_true", help="Usar los embeddings del almacén")
+    parser.add_argument("--json", help="Guardar los resultados en este fichero")
+    args = parser.parse_args()
+    
+    rows, n = run(args)
+    print_report(rows, n, args.k)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Compara las estrategias de troceado: velocidad, tamaños y tasa de acierto
+
+Uso:
+    python -m benchmarks.chunking                         # texto sintético
+    python -m benchmarks.chunking --file informe.txt      # texto propio (solo velocidad y tamaños)
+    python -m benchmarks.chunking --strategies fixed sentence --no-retrieval
+
+El texto sintético lleva "hechos" sembrados (p. ej. el código de un producto)
+entre frases de relleno. La tasa de acierto es el porcentaje de preguntas
+cuyo hecho aparece completo en alguno de los RETRIEVAL_TOP_K chunks
+recuperados; mide cuánto daña a la búsqueda cortar frases por la mitad.
+"""
+import argparse
+import json
+import random
+import time
+
+from config.settings import settings
+from services.chunking_service import chunk_stats, get_chunker
+
+FILLER = [
+    "El informe trimestral recoge la evolución de las ventas en todas las regiones.",
+    "Los responsables de cada área revisaron los procedimientos internos durante el periodo.",
+    "Se recomienda consultar el anexo técnico para más detalles sobre la metodología.",
+    "La plantilla se mantuvo estable y no hubo cambios relevantes en la organización.",
+    "Los proveedores cumplieron los plazos de entrega acordados en el contrato marco.",
+    "El comité aprobó el presupuesto con algunas observaciones menores.",
+]
+
+
+def synthetic_corpus(facts: int, filler_per_fact: int, seed: int):
+    """
+    Genera páginas de texto con hechos sembrados y sus preguntas
+    
+    Returns:
+        (páginas, [(pregunta, respuesta esperada)])
+    """
+    rng = random.Random(seed)
+    pages, questions, sentences = [], [], []
+    for i in range(facts):
+        code = f"PX-{rng.randint(1000, 9999)}-{i}"
+        sentences.append(f"El código asignado al producto número {i} es {code}.")
+        questions.append((f"¿Cuál es el código del producto número {i}?", code))
+        sentences.extend(rng.choice(FILLER) for _ in range(filler_per_fact))
+        if len(sentences) > 60:
+            pages.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        pages.append(" ".join(sentences))
+    return pages, questions
+
+
+def measure_strategy(strategy: str, pages: list, repeats: int) -> tuple:
+    """
+    Trocea todas las páginas y mide el rendimiento
+    
+    Returns:
+        (fila de resultados, lista de textos de los chunks)
+    """
+    chunker = get_chunker(strategy)
+    chunker.split_many(pages[:1])  # calentar (p. ej. cargar el tokenizador)
+    
+    total_bytes = sum(len(page.encode("utf-8")) for page in pages)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        spans_per_page = chunker.split_many(pages)
+    elapsed = (time.perf_counter() - start) / repeats
+    
+    chunks = [page[a:b] for page, spans in zip(pages, spans_per_page) for a, b in spans]
+    row = {"strategy": strategy, "mb_per_s": total_bytes / elapsed / 1e6 if elapsed else 0.0}
+    row.update(chunk_stats([len(chunk) for chunk in chunks]))
+    return row, chunks
+
+
+def hit_rate(chunks: list, questions: list, k: int) -> float:
+    """
+    Porcentaje de preguntas cuyo hecho aparece completo en los k chunks recuperados
+    """
+    from services.embedding_service import EmbeddingService
+    from services.vector_index import NumpyVectorIndex
+    
+    embedding_service = EmbeddingService()
+    ids = [str(i) for i in range(len(chunks))]
+    index = NumpyVectorIndex(embedding_service.encode_array(chunks), ids, chunks)
+    found, _ = index.search(embedding_service.encode_array([q for q, _ in questions]), k)
+    
+    hits = sum(
+        any(answer in chunks[i] for i in row)
+        for row, (_, answer) in zip(found, questions)
+    )
+    return hits / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de estrategias de troceado")
+    parser.add_argument("--strategies", nargs="+", default=["fixed", "sentence", "token"])
+    parser.add_argument("--file", help="Archivo de texto propio en lugar del sintético")
+    parser.add_argument("--facts", type=int, default=300)
+    parser.add_argument("--filler", type=int, default=8, help="Frases de relleno por hecho")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--no-retrieval", action="store_true", help="No medir la tasa de acierto")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guardar los resultados en este fichero")
+    args = parser.parse_args()
+    
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            pages, questions = [f.read()], []
+    else:
+        pages, questions = synthetic_corpus(args.facts, args.filler, args.seed)
+    
+    rows = []
+    for strategy in args.strategies:
+        try:
+            row, chunks = measure_strategy(strategy, pages, args.repeats)
+        except ImportError as e:
+            print(f"{strategy}: omitida ({e})")
+            continue
+        if questions and not args.no_retrieval:
+            row["hit_rate"] = hit_rate(chunks, questions, args.k)
+        rows.append(row)
+    
+    print(f"\n{'estrategia':<10} {'MB/s':>8} {'chunks':>7} {'media':>7} {'p95':>6} {'máx':>5} {'acierto':>8}")
+    for row in rows:
+        hit = f"{row['hit_rate']:.1%}" if "hit_rate" in row else "-"
+        print(f"{row['strategy']:<10} {row['mb_per_s']:>8.1f} {row['count']:>7} {row['mean']:>7.0f} "
+              f"{row['p95']:>6.0f} {row['max']:>5} {hit:>8}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Benchmark reproducible del camino completo: extracción, troceado,
+embeddings, índice, búsqueda y prompt
+
+Uso:
+    python -m benchmarks.pipeline                                   # corpus pequeño
+    python -m benchmarks.pipeline --pages 200 --json resultados.json
+    python -m benchmarks.pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline --baseline benchmarks/baseline.json   # compara y falla si empeora
+
+Genera un corpus sintético en PDF, DOCX, XLSX y TXT (mismo tamaño en cada
+formato, con "hechos" sembrados para medir también la tasa de acierto), lo
+indexa en un almacén temporal y mide:
+
+- extracción (páginas/s y MB/s por formato) y troceado (MB/s)
+- embeddings/s sin caché y tiempo de creación del índice
+- latencia de búsqueda (p50/p95/p99) y tasa de acierto
+- construcción del prompt y respuesta completa con un modelo local
+  (StubGenerativeModel): no hace falta GOOGLE_API_KEY ni conexión
+- pico de memoria (RSS) del proceso
+
+La comparación con la línea base marca como regresión cualquier métrica que
+empeore más que --tolerance; conviene generar la línea base en la misma
+máquina y con el mismo corpus.
+"""
+import argparse
+import asyncio
+import io
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.chunking import FILLER
+from config.settings import settings
+from models.document import ConversationMessage
+from services.metrics_service import STAGE_METRIC, metrics
+
+FORMATS = ["pdf", "docx", "xlsx", "txt"]
+
+
+def synthetic_pages(pages: int, sentences: int, seed: int, first_fact: int = 0):
+    """
+    Genera páginas de texto con dos hechos sembrados por página
+    
+    Returns:
+        (páginas, [(pregunta, respuesta esperada)])
+    """
+    rng = random.Random(seed)
+    texts, questions = [], []
+    fact = first_fact
+    for _ in range(pages):
+        page = [rng.choice(FILLER) for _ in range(sentences)]
+        for _ in range(2):
+            code = f"PX-{rng.randint(1000, 9999)}-{fact}"
+            page.insert(rng.randrange(len(page) + 1), f"El código asignado al producto número {fact} es {code}.")
+            questions.append((f"¿Cuál es el código del producto número {fact}?", code))
+            fact += 1
+        texts.append(" ".join(page))
+    return texts, questions
+
+
+def _pdf_lines(text: str, width: int = 95) -> list:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    return lines + [line] if line else lines
+
+
+def write_pdf(pages: list) -> bytes:
+    """
+    PDF mínimo con una página de texto (Helvetica) por elemento de `pages`
+    """
+    objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for text in pages:
+        lines = []
+        for line in _pdf_lines(text):
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            lines.append(b"(" + escaped.encode("cp1252", errors="replace") + b") Tj T*")
+        stream = b"BT /F1 10 Tf 12 TL 50 800 Td\n" + b"\n".join(lines) + b"\nET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+    
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def write_docx(pages: list) -> bytes:
+    from docx import Document as DocxWriter
+    
+    doc = DocxWriter()
+    for text in pages:
+        doc.add_paragraph(text)
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def write_xlsx(pages: list) -> bytes:
+    # Una hoja por página y una fila por frase
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    for number, text in enumerate(pages, start=1):
+        sheet = workbook.create_sheet(f"Hoja{number}")
+        sheet.append(["fila", "texto"])
+        for row, sentence in enumerate(text.split(". "), start=1):
+            sheet.append([row, sentence])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def write_txt(pages: list) -> bytes:
+    return "\n\n".join(pages).encode("utf-8")
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "xlsx": write_xlsx, "txt": write_txt}
+
+
+def synthetic_corpus(formats: list, pages: int, sentences: int, seed: int):
+    """
+    Un archivo por formato, cada uno con su propio texto (así la caché de
+    embeddings no se comparte entre formatos)
+    
+    Returns:
+        ({formato: bytes}, [(pregunta, respuesta esperada)])
+    """
+    files, questions = {}, []
+    for i, extension in enumerate(formats):
+        texts, facts = synthetic_pages(pages, sentences, seed + i, first_fact=len(questions))
+        files[extension] = WRITERS[extension](texts)
+        questions.extend(facts)
+    return files, questions
+
+
+def peak_rss_mb():
+    """
+    Pico de memoria residente del proceso (None donde no hay `resource`, p. ej. Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles_ms(seconds: list, prefix: str) -> dict:
+    values = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {f"{prefix}_p{q}_ms": float(value) for q, value in zip((50, 95, 99), values)}
+
+
+def measure_extraction(files: dict, repeats: int) -> tuple:
+    """
+    Extrae cada archivo `repeats` veces y mide páginas/s y MB/s de texto
+    
+    Returns:
+        (métricas, {formato: [(página, texto)]})
+    """
+    from services.extractor_service import ExtractorService
+    
+    results, extracted = {}, {}
+    for extension, data in files.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pages = list(ExtractorService.iter_pages(io.BytesIO(data), extension))
+        elapsed = (time.perf_counter() - start) / repeats
+        text_bytes = sum(len(text.encode("utf-8")) for _, text in pages)
+        results[f"extract_{extension}_pages_per_s"] = len(pages) / elapsed
+        results[f"extract_{extension}_mb_per_s"] = text_bytes / elapsed / 1e6
+        extracted[extension] = pages
+    return results, extracted
+
+
+def measure_chunking(document_service, extracted: dict, repeats: int) -> dict:
+    pages = [page for extension in extracted for page in extracted[extension]]
+    text_bytes = sum(len(text.encode("utf-8")) for _, text in pages)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        chunks = list(document_service.chunk_pages(pages))
+    elapsed = (time.perf_counter() - start) / repeats
+    return {"chunk_mb_per_s": text_bytes / elapsed / 1e6, "chunks": len(chunks)}
+
+
+def measure_prompt_building(ai_service, retrieval_result, question: str, repeats: int) -> dict:
+    """
+    Prompt con un historial largo recortado por ConversationMemory
+    """
+    from services.memory_service import ConversationMemory
+    
+    history = []
+    for turn in range(20):
+        history.append(ConversationMessage("Usuario", f"Pregunta de prueba número {turn} sobre el documento"))
+        history.append(ConversationMessage("Asistente", " ".join(FILLER)))
+    memory = ConversationMemory()
+    context = retrieval_result.get_context_text()
+    
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        ai_service.build_prompt(context, question, ai_service.format_history(history, memory), memory)
+        timings.append(time.perf_counter() - start)
+    return percentiles_ms(timings, "prompt_build")
+
+
+def run(args) -> dict:
+    """
+    Ejecuta el benchmark completo en un almacén temporal
+    
+    Returns:
+        {"meta": {...}, "metrics": {nombre: valor}, "stages": {...}}
+    """
+    store = tempfile.mkdtemp(prefix="rag-bench-")
+    settings.VECTOR_STORE_PATH = store
+    settings.EMBEDDING_CACHE_PATH = ""
+    metrics.reset()
+    
+    from services.ai_service import AIService
+    from services.database_service import DatabaseService
+    from services.document_service import DocumentService
+    from services.embedding_service import EmbeddingService
+    from services.rag_pipeline import RagPipeline
+    from services.stub_model import StubGenerativeModel
+    
+    results = {}
+    rss = {}
+    try:
+        print(f"Generando corpus: {args.pages} páginas x {len(args.formats)} formatos")
+        files, questions = synthetic_corpus(args.formats, args.pages, args.sentences, args.seed)
+        results["corpus_mb"] = sum(len(data) for data in files.values()) / 1e6
+        
+        # 1. Extracción y troceado
+        extraction, extracted = measure_extraction(files, args.repeats)
+        results.update(extraction)
+        document_service = DocumentService()
+        results.update(measure_chunking(document_service, extracted, args.repeats))
+        
+        documents = []
+        start = time.perf_counter()
+        for extension, data in files.items():
+            documents.append(document_service.process_file(io.BytesIO(data), f"benchmark.{extension}"))
+        results["process_file_s"] = time.perf_counter() - start
+        rss["ingest"] = peak_rss_mb()
+        
+        # 2. Embeddings sin caché y creación del índice (también sin caché)
+        embedding_service = EmbeddingService()
+        texts = [text for document in documents for text in document.chunks.contents()]
+        embedding_service.encode_array(texts[:8])  # calentar el modelo
+        embedding_service.cache.clear()
+        start = time.perf_counter()
+        embedding_service.encode_array(texts)
+        results["embeddings_per_s"] = len(texts) / (time.perf_counter() - start)
+        
+        embedding_service.cache.clear()
+        database_service = DatabaseService(embedding_service)
+        start = time.perf_counter()
+        for document in documents:
+            database_service.create_collection(document)
+        results["index_build_s"] = time.perf_counter() - start
+        rss["index"] = peak_rss_mb()
+        
+        # 3. Búsqueda: preguntas distintas (sin aciertos de la caché de embeddings)
+        file_hashes = [document.file_hash for document in documents]
+        sample = random.Random(args.seed).sample(questions, min(args.queries, len(questions)))
+        for question, _ in sample[:3]:
+            database_service.retrieve_context(question, file_hashes=file_hashes)
+        latencies, hits = [], 0
+        for question, answer in sample:
+            start = time.perf_counter()
+            retrieval_result = database_service.retrieve_context(question, file_hashes=file_hashes)
+            latencies.append(time.perf_counter() - start)
+            hits += any(answer in chunk for chunk in retrieval_result.chunks)
+        results.update(percentiles_ms(latencies, "query"))
+        results["hit_rate"] = hits / len(sample)
+        
+        # 4. Prompt y respuesta completa con el modelo local
+        ai_service = AIService(model=StubGenerativeModel())
+        results.update(measure_prompt_building(ai_service, retrieval_result, sample[0][0], args.repeats * 100))
+        
+        pipeline = RagPipeline(database_service, ai_service, answer_cache=None)
+        try:
+            start = time.perf_counter()
+            answers = asyncio.run(pipeline.answer_many([q for q, _ in sample], file_hashes, use_cache=False))
+            elapsed = time.perf_counter() - start
+        finally:
+            pipeline.close()
+        errors = [a.error for a in answers if a.error]
+        if errors:
+            raise RuntimeError(f"{len(errors)} respuestas con error, p. ej.: {errors[0]}")
+        results.update(percentiles_ms([a.timings["total"] for a in answers], "answer"))
+        results["answers_per_s"] = len(answers) / elapsed
+        rss["query"] = peak_rss_mb()
+        
+        if rss["query"] is not None:
+            results["peak_rss_mb"] = rss["query"]
+    finally:
+        shutil.rmtree(store, ignore_errors=True)
+    
+    stages = {
+        row["labels"]["stage"]: {"count": row["count"], "p50_ms": row["p50"] * 1000, "p95_ms": row["p95"] * 1000}
+        for row in metrics.snapshot()["distributions"] if row["name"] == STAGE_METRIC
+    }
+    meta = {
+        "pages": args.pages,
+        "sentences": args.sentences,
+        "formats": args.formats,
+        "queries": len(sample),
+        "seed": args.seed,
+        "chunk_strategy": settings.CHUNK_STRATEGY,
+        "chunk_size": settings.CHUNK_SIZE,
+        "embedding_model": settings.EMBEDDING_MODEL_NAME,
+        "vector_backend": settings.VECTOR_BACKEND,
+        "retrieval_mode": settings.RETRIEVAL_MODE,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    return {"meta": meta, "metrics": results, "rss_mb": rss, "stages": stages}
+
+
+def higher_is_better(name: str) -> bool:
+    return name.endswith("_per_s") or name == "hit_rate"
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> int:
+    """
+    Imprime la comparación con la línea base
+    
+    Returns:
+        Número de métricas que empeoran más que `tolerance` (fracción)
+    """
+    for key in ("pages", "sentences", "formats", "seed", "chunk_strategy", "embedding_model", "vector_backend", "retrieval_mode"):
+        if report["meta"].get(key) != baseline["meta"].get(key):
+            print(f"Aviso: {key} distinto de la línea base ({baseline['meta'].get(key)} -> {report['meta'].get(key)})")
+    
+    regressions = 0
+    print(f"\n{'métrica':<28} {'base':>10} {'actual':>10} {'cambio':>8}")
+    for name, value in report["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None or name in ("chunks", "corpus_mb"):
+            continue
+        change = (value - base) / base if base else 0.0
+        worse = -change if higher_is_better(name) else change
+        mark = "  REGRESIÓN" if worse > tolerance else ""
+        regressions += bool(mark)
+        print(f"{name:<28} {base:>10.2f} {value:>10.2f} {change:>+8.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta, búsqueda y construcción del prompt")
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--pages", type=int, default=50, help="Páginas por formato")
+    parser.add_argument("--sentences", type=int, default=40, help="Frases por página")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=3, help="Repeticiones de las medidas rápidas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guardar los resultados en este fichero")
+    parser.add_argument("--baseline", help="Línea base (JSON) con la que comparar")
+    parser.add_argument("--save-baseline", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Empeoramiento permitido (0.10 = 10%%)")
+    args = parser.parse_args()
+    
+    report = run(args)
+    
+    print(f"\n{'métrica':<28} {'valor':>10}")
+    for name, value in report["metrics"].items():
+        print(f"{name:<28} {value:>10.2f}")
+    
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {path}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{regressions} métrica(s) empeoran más de un {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,17 +16,78 @@ class Settings:
     EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
     GEMINI_MODEL_NAME = "gemini-2.5-flash"
     
+    # Caché de embeddings
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))  # Vectores en memoria
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")  # SQLite opcional ("" = solo memoria)
+    EMBEDDING_BATCH_SIZE = 64  # Chunks por lote al indexar
+    
     # Configuración de chunks
+    CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "fixed")  # "fixed", "sentence" o "token"
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 100
+    CHUNK_MAX_TOKENS = 200  # Estrategia "token" (all-MiniLM-L6-v2 trunca a 256)
+    CHUNK_OVERLAP_TOKENS = 40
+    CHUNK_BATCH_PAGES = 32  # Páginas que se tokenizan juntas
+    
+    # Hojas de cálculo: grupos de filas con la cabecera repetida
+    SPREADSHEET_CHUNK_CHARS = 1000  # Tamaño máximo de un grupo
+    SPREADSHEET_MAX_ROWS_PER_CHUNK = 50
     
     # Configuración de búsqueda
     RETRIEVAL_TOP_K = 4  # Número de fragmentos a recuperar
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma", "numpy" (exacta) o "ivf" (aproximada)
+    VECTOR_METRIC = "cosine"  # Métrica de los backends "numpy" e "ivf": "cosine" o "dot"
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # "hybrid" (BM25 + vectores) o "vector"
+    HYBRID_CANDIDATES = 20  # Candidatos de cada búsqueda (léxica y vectorial) antes de fusionar
+    RRF_K = 60  # Constante de Reciprocal Rank Fusion
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    
+    # Reordenado con cross-encoder: se buscan RERANK_CANDIDATES y se envían RERANK_TOP_K a Gemini
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # Multilingüe (preguntas en español)
+    RERANK_CANDIDATES = 20
+    RERANK_TOP_K = 3
+    RERANK_TIME_BUDGET_MS = float(os.getenv("RERANK_TIME_BUDGET_MS", "300"))  # 0 = sin límite
+    
+    # Búsqueda aproximada (VECTOR_BACKEND = "ivf"); ver benchmarks/ann_recall.py
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # Grupos de k-means (0 = 4 * raíz del nº de chunks)
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))  # Grupos explorados por consulta
+    IVF_KMEANS_ITERATIONS = 10
+    IVF_MIN_VECTORS = 20000  # Por debajo se usa la búsqueda exacta
+    IVF_CACHE_SIZE = 4  # Conjuntos de documentos con índice IVF en memoria
+    
+    # Llamadas al modelo desde RagPipeline
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # Llamadas simultáneas a Gemini
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))  # Por intento (0 = sin límite)
+    LLM_MAX_RETRIES = 2  # Reintentos tras un fallo
+    LLM_RETRY_BACKOFF_SECONDS = 1.0  # Espera antes del primer reintento (se duplica en cada uno)
+    RETRIEVAL_WORKERS = 4  # Hilos para búsquedas simultáneas
+    
+    # Métricas (services/metrics_service.py)
+    METRICS_MAX_SAMPLES = 2048  # Muestras recientes por métrica para calcular p50/p95/p99
+    
+    # Memoria de la conversación en el prompt
+    MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))  # Tokens máximos del historial
+    MEMORY_RECENT_TURNS = 4  # Turnos (pregunta + respuesta) que van literales
+    MEMORY_SUMMARY_MAX_TOKENS = 300  # Tamaño del resumen de los turnos anteriores
+    
+    # Caché de respuestas (preguntas casi iguales sobre los mismos documentos)
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Similitud coseno mínima
+    ANSWER_CACHE_SIZE = 1000  # Respuestas guardadas
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # 0 = no caducan
+    ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "./vector_store/answer_cache.sqlite")  # "" = solo memoria
+    
+    # ChromaDB (una colección por documento, nombrada por su hash)
+    VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./vector_store")
+    VECTOR_STORE_MAX_DOCUMENTS = int(os.getenv("VECTOR_STORE_MAX_DOCUMENTS", "50"))  # 0 = sin límite
+    VECTOR_STORE_MAX_CHUNKS = int(os.getenv("VECTOR_STORE_MAX_CHUNKS", "200000"))  # 0 = sin límite
     
-    # ChromaDB
-    COLLECTION_NAME = "pdf_rag"
+    # Servidor HTTP (server.py)
+    INGEST_ROOT = os.getenv("INGEST_ROOT", "")  # Carpeta de la que /ingest puede leer rutas ("" = solo subidas)
     
     # Streamlit
+    WARMUP_SERVICES = os.getenv("WARMUP_SERVICES", "true").lower() == "true"  # Precargar modelos en segundo plano
     PAGE_TITLE = "Chat PDF con Gemini"
     PAGE_ICON = "📄"
     
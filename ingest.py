@@ -0,0 +1,66 @@
+"""
+Indexa muchos archivos desde la línea de comandos, sin Streamlit
+
+Uso:
+    python ingest.py documentos/ informe.pdf datos.xlsx --workers 4
+
+Las carpetas se recorren de forma recursiva buscando PDF, DOCX, XLSX y TXT.
+Los documentos quedan en el almacén persistente (VECTOR_STORE_PATH) y la
+aplicación los carga al instante cuando se suben.
+"""
+import argparse
+import os
+import sys
+import time
+
+from services.ingest_service import SUPPORTED_EXTENSIONS
+from services.service_registry import registry
+
+
+def collect_paths(inputs):
+    """Expande las carpetas en la lista de archivos que contienen"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if name.rsplit(".", 1)[-1].lower() in SUPPORTED_EXTENSIONS:
+                        paths.append(os.path.join(root, name))
+        else:
+            paths.append(item)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexa archivos en el almacén vectorial")
+    parser.add_argument("inputs", nargs="+", help="Archivos o carpetas")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de extracción (por defecto, nº de CPUs)")
+    args = parser.parse_args()
+
+    paths = collect_paths(args.inputs)
+    if not paths:
+        print("No se encontraron archivos para indexar")
+        return 1
+
+    ingest_service = registry.get_ingest_service()
+
+    def report(result):
+        detail = result.error if result.error else f"{result.chunks} chunks, {result.seconds:.1f}s"
+        if result.reused:
+            detail += f", {result.reused} embeddings reutilizados"
+        print(f"[{result.status}] {result.file_name}: {detail}")
+
+    start = time.perf_counter()
+    results = ingest_service.ingest_files(paths, workers=args.workers, progress_callback=report)
+    elapsed = time.perf_counter() - start
+
+    errors = [r for r in results if r.status == "error"]
+    print(f"\n{len(results)} archivos en {elapsed:.1f}s: "
+          f"{sum(r.status == 'indexado' for r in results)} indexados, "
+          f"{sum(r.status == 'ya indexado' for r in results)} ya indexados, "
+          f"{len(errors)} con error")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
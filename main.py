@@ -1,123 +1,372 @@
+import time
+
+# Inicio de esta ejecución del script (para medir la primera pintura)
+SCRIPT_START = time.perf_counter()
+
+import asyncio
+
 import streamlit as st
 from config.settings import settings
 
-# Nota: Importamos DocumentService en lugar de PDFService
-from services.document_service import DocumentService
-from services.embedding_service import EmbeddingService
-from services.database_service import DatabaseService
-from services.ai_service import AIService
 from services.conversation_service import ConversationService
+from services.metrics_service import metrics
+# Los servicios pesados se cargan una sola vez por proceso
+from services.service_registry import registry
 
 class ChatApp: # Le cambié el nombre a ChatApp (más genérico)
     def __init__(self):
-        # 👇 Aquí usamos el nuevo servicio
-        self.document_service = DocumentService()
-        self.embedding_service = EmbeddingService()
-        self.database_service = DatabaseService(self.embedding_service)
-        self.ai_service = AIService()
-        self.conversation_service = ConversationService()
+        # Streamlit crea un ChatApp en cada rerun: los servicios vienen del registro.
+        # Los pesados se crean la primera vez que se usan (ver las propiedades)
+        self.document_service = registry.get_document_service()
+        self.conversation_service = ConversationService(summarize=self.summarize)
+    
+    @property
+    def embedding_service(self):
+        return registry.get_embedding_service()
+    
+    @property
+    def database_service(self):
+        return registry.get_database_service()
+    
+    @property
+    def ai_service(self):
+        return registry.get_ai_service()
+    
+    @property
+    def answer_cache(self):
+        return registry.get_answer_cache()
+    
+    @property
+    def rag_pipeline(self):
+        return registry.get_rag_pipeline()
+    
+    def summarize(self, prompt: str) -> str:
+        # Gemini se carga al hacer el primer resumen, no al crear la conversación
+        return self.ai_service.generate_simple_response(prompt)
     
     def initialize_session_state(self):
-        if "document" not in st.session_state:
-            st.session_state.document = None
-        if "file_processed" not in st.session_state:
-            st.session_state.file_processed = False
-        if "file_hash" not in st.session_state:
-            st.session_state.file_hash = None
+        # Documentos de esta sesión: hash -> nombre del archivo
+        if "documents" not in st.session_state:
+            st.session_state.documents = {}
+        # Documentos sobre los que se pregunta ahora mismo
+        if "active_hashes" not in st.session_state:
+            st.session_state.active_hashes = []
         if "conversation_service" not in st.session_state:
             st.session_state.conversation_service = self.conversation_service
-        if "database_service" not in st.session_state:
-            st.session_state.database_service = None
+        # Hash de cada archivo subido, para no recalcularlo en cada rerun
+        if "file_hashes" not in st.session_state:
+            st.session_state.file_hashes = {}
+    
+    @staticmethod
+    def file_key(uploaded_file):
+        # file_id identifica cada subida (las versiones antiguas de Streamlit no lo tienen)
+        return getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
     
-    def process_document(self, uploaded_file):
+    def get_file_hash(self, uploaded_file) -> str:
+        """Hash de un archivo subido, calculado una sola vez mientras siga subido"""
+        key = self.file_key(uploaded_file)
+        file_hashes = st.session_state.file_hashes
+        if key not in file_hashes:
+            file_hashes[key] = self.document_service.hash_file(uploaded_file)
+        return file_hashes[key]
+    
+    def process_document(self, uploaded_file, file_hash: str):
         """Procesa cualquier archivo (PDF, DOCX, XLSX, TXT)"""
         with st.spinner(f"Procesando {uploaded_file.name}..."):
-            # 👇 Usamos process_file del nuevo servicio
-            document = self.document_service.process_file(uploaded_file, uploaded_file.name)
+            # 👇 Usamos process_file del nuevo servicio (con el hash ya calculado)
+            document = self.document_service.process_file(uploaded_file, uploaded_file.name, file_hash)
+            
+            # Crear colección en base de datos (una por documento), con progreso
+            progress_bar = st.progress(0.0, text="Generando embeddings...")
             
-            # Crear colección en base de datos
-            self.database_service.create_collection(document)
+            def report_progress(done: int, total: int):
+                progress_bar.progress(done / total, text=f"Embeddings: {done}/{total} fragmentos")
             
-            # Guardar en sesión
-            st.session_state.database_service = self.database_service
-            st.session_state.document = document
-            st.session_state.file_processed = True
-            st.session_state.file_hash = document.file_hash
+            index_stats = self.database_service.create_collection(document, progress_callback=report_progress)
+            progress_bar.empty()
             
-            # Limpiar historial al cambiar de documento
-            st.session_state.conversation_service.clear_history()
+            # Guardar en sesión (una versión nueva sustituye a la anterior del mismo archivo)
+            documents = st.session_state.documents
+            for existing_hash in [h for h, name in documents.items() if name == document.file_name]:
+                del documents[existing_hash]
+            documents[document.file_hash] = document.file_name
+        
+        stats = self.document_service.get_chunk_stats(document.chunks)
+        message = (
+            f"{document.file_name}: {stats['count']} fragmentos generados "
+            f"({stats['mean']:.0f} caracteres de media, máximo {stats['max']})."
+        )
+        if index_stats["reused"]:
+            message += f" {index_stats['reused']} embeddings reutilizados de la versión anterior."
+        st.success(message)
+    
+    def load_known_document(self, file_hash: str, file_name: str) -> bool:
+        """Añade a la sesión un documento ya indexado sin extraer ni generar embeddings"""
+        if not self.database_service.load_collection(file_hash):
+            return False
+        
+        st.session_state.documents[file_hash] = file_name
+        st.success(f"{file_name}: ya procesado anteriormente, cargado desde disco.")
+        return True
+    
+    def forget_missing_documents(self, file_hashes):
+        """Quita de la sesión los documentos que ya no están en el almacén"""
+        missing = [h for h in file_hashes if not self.database_service.has_document(h)]
+        for file_hash in missing:
+            st.session_state.documents.pop(file_hash, None)
+        st.session_state.active_hashes = [h for h in st.session_state.active_hashes if h not in missing]
+    
+    def handle_question(self, question: str, use_cache: bool = True):
+        """Recupera el contexto y devuelve la respuesta como iterador de fragmentos
         
-        st.success(f"Archivo procesado: {len(document.chunks)} fragmentos generados.")
-    
-    def handle_question(self, question: str):
-        with st.spinner("Pensando..."):
-            db_service = st.session_state.database_service
-            if db_service is None:
-                st.error("Primero debes procesar un documento.")
-                return "", None
+        Devuelve (respuesta, contexto, si la respuesta viene de la caché).
+        """
+        with st.spinner("Buscando en los documentos..."):
+            active_hashes = st.session_state.active_hashes
+            if not active_hashes:
+                st.error("Primero debes procesar y seleccionar un documento.")
+                return None, None, False
 
-            # Recuperar contexto relevante
-            retrieval_result = db_service.retrieve_context(question)
-            context_text = retrieval_result.get_context_text()
-            
-            history = st.session_state.conversation_service.get_history()
+            conversation_service = st.session_state.conversation_service
+            history = conversation_service.get_history()
             
-            # Generar respuesta
-            answer = self.ai_service.generate_response(context_text, question, history)
+            # Una pregunta ya respondida (o casi igual) sobre los mismos documentos
+            # no necesita buscar contexto ni llamar a Gemini
+            if use_cache and self.answer_cache.is_cacheable(question, history):
+                query_vector = self.embedding_service.encode_query(question)
+                cached = self.answer_cache.lookup(active_hashes, query_vector, question)
+                if cached is not None:
+                    return iter([cached["answer"]]), cached["retrieval_result"], True
+            else:
+                self.answer_cache.record_bypass()
+
+            # Recuperar contexto y formatear el historial (recortado al presupuesto
+            # de tokens) a la vez, y construir el prompt
+            try:
+                prompt, retrieval_result = asyncio.run(self.rag_pipeline.prepare(
+                    question, active_hashes, history, conversation_service.memory
+                ))
+            except ValueError as e:
+                # Algún documento se ha expulsado del almacén (quizá desde otra sesión)
+                self.forget_missing_documents(active_hashes)
+                st.error(f"{e} Vuelve a procesarlo para seguir preguntando sobre él.")
+                return None, None, False
             
-            # Actualizar historial
-            st.session_state.conversation_service.add_user_message(question)
-            st.session_state.conversation_service.add_assistant_message(answer)
+            # Generar respuesta en streaming
+            answer_stream = self.ai_service.stream_prompt(prompt)
             
-            return answer, retrieval_result
+            return answer_stream, retrieval_result, False
+    
+    def save_turn(self, question: str, answer: str):
+        """Guarda la pregunta y la respuesta completa en el historial"""
+        st.session_state.conversation_service.add_user_message(question)
+        st.session_state.conversation_service.add_assistant_message(answer)
+    
+    def cache_answer(self, question: str, answer: str, retrieval_result):
+        """Guarda en la caché una respuesta recién generada si no depende del historial
+        
+        Se llama antes de save_turn, con el historial tal como estaba al preguntar.
+        """
+        history = st.session_state.conversation_service.get_history()
+        if not answer or not self.answer_cache.is_cacheable(question, history):
+            return
+        # El embedding de la pregunta ya está en la caché de embeddings
+        query_vector = self.embedding_service.encode_query(question)
+        self.answer_cache.put(st.session_state.active_hashes, query_vector, question, answer, retrieval_result)
     
     def render_ui(self):
         st.title("Chat Multi-Formato")
         st.markdown("Soporta: **PDF, Excel (.xlsx), Word (.docx), Texto (.txt)**")
         
-        # 👇 Widget actualizado para múltiples tipos
-        uploaded_file = st.file_uploader("Sube tu archivo", type=["pdf", "docx", "xlsx", "txt"])
+        # 👇 Widget actualizado para múltiples tipos y varios archivos
+        uploaded_files = st.file_uploader(
+            "Sube tus archivos",
+            type=["pdf", "docx", "xlsx", "txt"],
+            accept_multiple_files=True
+        )
+        self.record_first_paint()
         
-        if uploaded_file:
-            # Calcular hash para detectar cambios de archivo
-            current_hash = self.document_service.hash_file(uploaded_file)
-            
-            if st.session_state.file_hash != current_hash:
-                st.session_state.file_hash = current_hash
-                st.session_state.file_processed = False
-                st.session_state.document = None
-                st.session_state.database_service = None
-                st.session_state.conversation_service.clear_history()
+        # Archivos subidos que todavía no están en la sesión
+        pending_files = []
+        for uploaded_file in uploaded_files or []:
+            # Hash para detectar archivos nuevos (solo se calcula la primera vez)
+            current_hash = self.get_file_hash(uploaded_file)
+            if current_hash in st.session_state.documents:
+                continue
+            
+            # Si el documento ya se indexó antes, se carga directamente desde disco
+            if not self.load_known_document(current_hash, uploaded_file.name):
+                pending_files.append((uploaded_file, current_hash))
+        
+        # Olvidar los hashes de los archivos que ya se han quitado
+        current_keys = {self.file_key(uploaded_file) for uploaded_file in uploaded_files or []}
+        st.session_state.file_hashes = {
+            key: file_hash for key, file_hash in st.session_state.file_hashes.items() if key in current_keys
+        }
         
         # Botón de procesamiento
-        if uploaded_file and not st.session_state.file_processed:
-            if st.button("Procesar Archivo"):
-                self.process_document(uploaded_file)
+        if pending_files:
+            if st.button(f"Procesar {len(pending_files)} archivo(s)"):
+                for uploaded_file, file_hash in pending_files:
+                    self.process_document(uploaded_file, file_hash)
         
         # Área de chat
-        if st.session_state.file_processed:
+        documents = st.session_state.documents
+        if documents:
             st.divider()
-            question = st.chat_input("Pregunta sobre tu documento...")
+            active_hashes = st.multiselect(
+                "Documentos a consultar",
+                options=list(documents.keys()),
+                default=list(documents.keys()),
+                format_func=lambda file_hash: documents[file_hash]
+            )
+            
+            # Cambiar de documentos no reconstruye nada, solo limpia el historial
+            if active_hashes != st.session_state.active_hashes:
+                st.session_state.active_hashes = active_hashes
+                st.session_state.conversation_service.clear_history()
+            
+            skip_cache = st.checkbox(
+                "Generar una respuesta nueva (sin usar la caché)",
+                help="La respuesta nueva sustituye a la guardada para preguntas parecidas"
+            )
+            question = st.chat_input("Pregunta sobre tus documentos...")
             
             if question:
                 # Mostrar mensaje del usuario inmediatamente
                 with st.chat_message("user"):
                     st.write(question)
 
-                # Procesar y mostrar respuesta
-                answer, retrieval_result = self.handle_question(question)
-                
-                if answer:
-                    with st.chat_message("assistant"):
-                        st.write(answer)
-                        with st.expander("Ver contexto utilizado"):
-                            for chunk in retrieval_result.chunks:
-                                st.text(chunk)
+                # Cada etapa de la pregunta (búsqueda, prompt, modelo) queda en la traza
+                with metrics.trace("pregunta") as trace:
+                    # Procesar y mostrar la respuesta a medida que llega
+                    answer_stream, retrieval_result, from_cache = self.handle_question(
+                        question, use_cache=not skip_cache
+                    )
+                    
+                    if answer_stream is not None:
+                        with st.chat_message("assistant"):
+                            answer = st.write_stream(answer_stream)
+                            if from_cache:
+                                st.caption("Respuesta guardada de una pregunta parecida")
+                            else:
+                                self.cache_answer(question, answer, retrieval_result)
+                            self.save_turn(question, answer)
+                            with st.expander("Ver contexto utilizado"):
+                                timings = retrieval_result.timings
+                                if "rerank_ms" in timings:
+                                    status = "orden de la búsqueda (fuera de plazo)" if timings["rerank_fallback"] else "reordenado"
+                                    st.caption(
+                                        f"{len(retrieval_result.chunks)} de {timings['rerank_candidates']} candidatos, "
+                                        f"{status} en {timings['rerank_ms']:.0f} ms"
+                                    )
+                                for chunk, source, page in zip(
+                                    retrieval_result.chunks, retrieval_result.sources, retrieval_result.page_numbers
+                                ):
+                                    citation = documents.get(source, source[:12])
+                                    if page is not None:
+                                        citation += f" (página {page})"
+                                    st.caption(citation)
+                                    st.text(chunk)
+                st.session_state.last_trace = trace.to_dict()
+            
+            self.render_debug_panel()
+
+    def record_first_paint(self):
+        """Anota cuánto tardó en pintarse la página (cabecera y selector de archivos)"""
+        elapsed = time.perf_counter() - SCRIPT_START
+        st.session_state.last_paint = elapsed
+        # La primera ejecución del proceso incluye importar los módulos (arranque en frío)
+        registry.record_startup_timing("primera pintura", elapsed)
+
+    def render_startup_report(self):
+        """Muestra en la barra lateral cuánto tardó en cargarse cada servicio"""
+        with st.sidebar.expander("Tiempos de carga"):
+            startup = registry.get_startup_timings()
+            if "primera pintura" in startup:
+                st.text(f"Primera pintura (arranque en frío): {startup['primera pintura']:.2f}s")
+            if "last_paint" in st.session_state:
+                st.text(f"Pintura de esta ejecución: {st.session_state.last_paint:.2f}s")
+            
+            for name, seconds in registry.get_load_timings().items():
+                st.text(f"{name}: {seconds:.2f}s")
+            
+            # Solo servicios ya cargados: el informe no debe forzar la carga del modelo
+            if not registry.is_loaded("embedding"):
+                st.caption("Modelos aún no cargados" + (" (cargando en segundo plano)" if settings.WARMUP_SERVICES else ""))
+                return
+            
+            cache_stats = self.embedding_service.get_cache_stats()
+            st.text(
+                f"Caché de embeddings: {cache_stats['hits']} aciertos, "
+                f"{cache_stats['misses']} fallos ({cache_stats['hit_rate']:.0%})"
+            )
+            
+            if not registry.is_loaded("answer_cache"):
+                return
+            answer_stats = self.answer_cache.get_stats()
+            st.text(
+                f"Caché de respuestas: {answer_stats['hits']} aciertos, "
+                f"{answer_stats['misses']} fallos ({answer_stats['hit_rate']:.0%}), "
+                f"{answer_stats['bypassed']} sin caché, {answer_stats['entries']} guardadas"
+            )
+    
+    def render_debug_panel(self):
+        """Muestra los tiempos de cada etapa de la última pregunta y las métricas del proceso"""
+        last_trace = st.session_state.get("last_trace")
+        with st.expander("Depuración: tiempos de la última pregunta"):
+            if last_trace is None:
+                st.caption("Todavía no se ha hecho ninguna pregunta")
+            else:
+                for span in last_trace["spans"]:
+                    st.text(f"{span['stage']}: {span['ms']:.1f} ms")
+                for name, value in last_trace["values"].items():
+                    st.text(f"{name}: {value:g}")
+            
+            st.caption("Todas las preguntas de este proceso (p50 / p95 / p99)")
+            for row in metrics.snapshot()["distributions"]:
+                if row["name"] != "rag_stage_seconds":
+                    continue
+                st.text(
+                    f"{row['labels']['stage']}: {row['p50'] * 1000:.0f} / {row['p95'] * 1000:.0f} / "
+                    f"{row['p99'] * 1000:.0f} ms ({row['count']} veces)"
+                )
+            
+            col_prometheus, col_json = st.columns(2)
+            col_prometheus.download_button(
+                "Métricas (Prometheus)", metrics.export_prometheus(), file_name="metrics.prom", mime="text/plain"
+            )
+            col_json.download_button(
+                "Métricas (JSON)", metrics.export_json(), file_name="metrics.json", mime="application/json"
+            )
+
+    def render_memory_report(self):
+        """Muestra en la barra lateral el tamaño del prompt del último turno"""
+        stats = st.session_state.conversation_service.get_memory_stats()
+        if stats["last"] is None:
+            return
+        
+        last = stats["last"]
+        with st.sidebar.expander("Memoria de la conversación"):
+            st.text(f"Prompt del último turno: ~{last['prompt_tokens']} tokens")
+            st.text(f"Historial: ~{last['history_tokens']} de {settings.MEMORY_TOKEN_BUDGET} tokens")
+            st.text(
+                f"Mensajes: {last['verbatim_messages']} literales, "
+                f"{last['summarized_messages']} resumidos, {last['dropped_messages']} descartados"
+            )
+            st.text(
+                f"Media: ~{stats['mean_prompt_tokens']:.0f} tokens/turno "
+                f"(máximo {stats['max_prompt_tokens']}) en {stats['turns']} turnos"
+            )
 
     def run(self):
         st.set_page_config(page_title=settings.PAGE_TITLE, page_icon="📚")
+        if settings.WARMUP_SERVICES:
+            registry.start_warmup()
         self.initialize_session_state()
         self.render_ui()
+        self.render_startup_report()
+        self.render_memory_report()
 
 if __name__ == "__main__":
     app = ChatApp()
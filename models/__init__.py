@@ -1,10 +1,15 @@
-from .document import Chunk, Document, ConversationMessage, RetrievalResult
+from .document import Chunk, Document, ConversationMessage, RetrievalResult, IngestResult, RagAnswer
+from .chunk_store import ChunkStore, ChunkStoreBuilder
 
 __all__ = [
     'Chunk',
+    'ChunkStore',
+    'ChunkStoreBuilder',
     'Document', 
     'ConversationMessage',
-    'RetrievalResult'
+    'RetrievalResult',
+    'IngestResult',
+    'RagAnswer'
 ]
 
 
@@ -15,4 +20,7 @@ __all__ = [
 #2. **Document**: Representa el PDF completo con todos sus chunks
 #3. **ConversationMessage**: Un mensaje del chat (pregunta o respuesta)
 #4. **RetrievalResult**: Resultado de buscar en la base de datos
+#5. **IngestResult**: Resultado de indexar un archivo en una carga por lotes
+#6. **RagAnswer**: Respuesta del pipeline asíncrono, con tiempos y errores
+#7. **ChunkStore**: Los chunks de un documento en formato compacto (texto una sola vez)
 
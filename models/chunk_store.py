@@ -0,0 +1,306 @@
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .document import Chunk
+
+# Valor de las columnas numéricas cuando el chunk no tiene ese dato (página, hoja, filas)
+MISSING = -1
+
+
+class ChunkStore:
+    """
+    Chunks de un documento guardados de forma compacta
+    
+    El texto del documento se guarda una sola vez (las páginas unidas con un
+    salto de línea) y cada chunk es una posición y una longitud dentro de él,
+    así el solapamiento entre chunks no duplica texto. Los metadatos van en
+    arrays de NumPy, uno por columna, y los ids en un diccionario para
+    buscarlos en tiempo constante.
+    
+    Se comporta como una lista de Chunk: len(), índices e iteración crean
+    cada Chunk (y copian su contenido) solo cuando se piden.
+    """
+    
+    def __init__(
+        self,
+        text: str,
+        ids: List[str],
+        starts: np.ndarray,
+        lengths: np.ndarray,
+        pages: Optional[np.ndarray] = None,
+        sheets: Optional[np.ndarray] = None,
+        sheet_names: Optional[List[str]] = None,
+        row_starts: Optional[np.ndarray] = None,
+        row_ends: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            text: Texto completo del documento
+            ids: ID de cada chunk
+            starts: Posición (en caracteres) de cada chunk dentro de text
+            lengths: Longitud de cada chunk
+            pages: Página de cada chunk (MISSING = sin página)
+            sheets: Índice en sheet_names de la hoja de cada chunk (MISSING = no es de Excel)
+            sheet_names: Nombres de las hojas
+            row_starts: Primera fila de cada chunk de Excel
+            row_ends: Última fila de cada chunk de Excel
+        """
+        n = len(ids)
+        self.text = text
+        self.ids = list(ids)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+        self.pages = self._column(pages, n)
+        self.sheets = self._column(sheets, n)
+        self.sheet_names = list(sheet_names or [])
+        self.row_starts = self._column(row_starts, n)
+        self.row_ends = self._column(row_ends, n)
+        
+        if not (len(self.starts) == len(self.lengths) == len(self.pages) == n):
+            raise ValueError("Todas las columnas deben tener un valor por chunk")
+        self._positions = self._index_ids(self.ids)
+    
+    @staticmethod
+    def _column(values, n: int) -> np.ndarray:
+        if values is None:
+            return np.full(n, MISSING, dtype=np.int32)
+        return np.asarray(values, dtype=np.int32)
+    
+    @staticmethod
+    def _index_ids(ids: List[str]) -> Dict[str, int]:
+        positions = {}
+        for position, chunk_id in enumerate(ids):
+            positions.setdefault(chunk_id, position)
+        return positions
+    
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Chunk]) -> "ChunkStore":
+        """
+        Crea el almacén a partir de Chunks sueltos
+        
+        Su contenido se une en un texto nuevo, así que start_index pasa a
+        referirse a ese texto y no al documento original.
+        """
+        builder = ChunkStoreBuilder()
+        for chunk in chunks:
+            builder.add_text(chunk.content)
+            builder.add(Chunk(
+                id=chunk.id,
+                content=chunk.content,
+                start_index=builder.last_offset,
+                size=len(chunk.content),
+                page_number=chunk.page_number,
+                sheet_name=chunk.sheet_name,
+                row_start=chunk.row_start,
+                row_end=chunk.row_end
+            ))
+        return builder.build()
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("Índice de chunk fuera de rango")
+        
+        sheet = int(self.sheets[position])
+        return Chunk(
+            id=self.ids[position],
+            content=self.content(position),
+            start_index=int(self.starts[position]),
+            size=int(self.lengths[position]),
+            page_number=self._optional(self.pages[position]),
+            sheet_name=self.sheet_names[sheet] if sheet != MISSING else None,
+            row_start=self._optional(self.row_starts[position]),
+            row_end=self._optional(self.row_ends[position])
+        )
+    
+    def __iter__(self) -> Iterator[Chunk]:
+        for position in range(len(self)):
+            yield self[position]
+    
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._positions
+    
+    def __repr__(self):
+        return f"ChunkStore(chunks={len(self)}, chars={len(self.text)})"
+    
+    @staticmethod
+    def _optional(value) -> Optional[int]:
+        value = int(value)
+        return None if value == MISSING else value
+    
+    def content(self, position: int) -> str:
+        """
+        Texto de un chunk (se corta del texto del documento al pedirlo)
+        """
+        start = int(self.starts[position])
+        return self.text[start:start + int(self.lengths[position])]
+    
+    def contents(self, positions: Optional[Iterable[int]] = None) -> List[str]:
+        """
+        Texto de varios chunks (todos si no se indican posiciones)
+        """
+        if positions is None:
+            positions = range(len(self))
+        return [self.content(position) for position in positions]
+    
+    def index_of(self, chunk_id: str) -> Optional[int]:
+        """
+        Posición de un chunk por su ID, en tiempo constante
+        """
+        return self._positions.get(chunk_id)
+    
+    def get(self, chunk_id: str) -> Optional[Chunk]:
+        """
+        Chunk con ese ID, o None si no existe
+        """
+        position = self._positions.get(chunk_id)
+        return None if position is None else self[position]
+    
+    def page_numbers(self) -> List[Optional[int]]:
+        """
+        Página de cada chunk (None si no tiene)
+        """
+        return [None if page == MISSING else page for page in self.pages.tolist()]
+    
+    @property
+    def nbytes(self) -> int:
+        """
+        Memoria aproximada del texto y los arrays (sin contar los ids)
+        """
+        arrays = (self.starts, self.lengths, self.pages, self.sheets, self.row_starts, self.row_ends)
+        return len(self.text.encode("utf-8")) + sum(array.nbytes for array in arrays)
+    
+    def __getstate__(self) -> dict:
+        # El índice de ids se reconstruye al cargar: así se envía menos entre procesos
+        state = self.__dict__.copy()
+        del state["_positions"]
+        return state
+    
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._positions = self._index_ids(self.ids)
+    
+    def save(self, path: str) -> None:
+        """
+        Guarda el almacén en un .npz (el texto en UTF-8 y los arrays tal cual)
+        
+        Args:
+            path: Ruta del fichero .npz
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(
+            path,
+            text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+            ids=np.array(self.ids, dtype=str),
+            starts=self.starts,
+            lengths=self.lengths,
+            pages=self.pages,
+            sheets=self.sheets,
+            sheet_names=np.array(self.sheet_names, dtype=str),
+            row_starts=self.row_starts,
+            row_ends=self.row_ends
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["ChunkStore"]:
+        """
+        Carga un almacén guardado con save()
+        
+        Returns:
+            El almacén, o None si no existe
+        """
+        if not os.path.exists(path):
+            return None
+        
+        with np.load(path) as arrays:
+            return cls(
+                text=arrays["text"].tobytes().decode("utf-8"),
+                ids=arrays["ids"].tolist(),
+                starts=arrays["starts"],
+                lengths=arrays["lengths"],
+                pages=arrays["pages"],
+                sheets=arrays["sheets"],
+                sheet_names=arrays["sheet_names"].tolist(),
+                row_starts=arrays["row_starts"],
+                row_ends=arrays["row_ends"]
+            )
+
+
+class ChunkStoreBuilder:
+    """
+    Construye un ChunkStore a medida que se extraen y trocean las páginas
+    
+    Los textos se unen con un salto de línea entre ellos, igual que cuentan
+    las posiciones DocumentService.chunk_pages y chunk_row_groups, así el
+    start_index de cada Chunk es su posición en el texto del almacén.
+    """
+    
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        self.last_offset = 0
+        self._ids: List[str] = []
+        self._starts: List[int] = []
+        self._lengths: List[int] = []
+        self._pages: List[int] = []
+        self._sheets: List[int] = []
+        self._sheet_positions: Dict[str, int] = {}
+        self._row_starts: List[int] = []
+        self._row_ends: List[int] = []
+    
+    def add_text(self, text: str) -> None:
+        """
+        Añade el texto de una página (o de un grupo de filas)
+        """
+        if self._parts:
+            self._parts.append("\n")
+            self._length += 1
+        self.last_offset = self._length
+        self._parts.append(text)
+        self._length += len(text)
+    
+    def pages(self, pages: Iterable) -> Iterator:
+        """
+        Deja pasar (número de página, texto) añadiendo cada texto al almacén
+        """
+        for page in pages:
+            self.add_text(page[1])
+            yield page
+    
+    def add(self, chunk: Chunk) -> None:
+        """
+        Añade los datos de un chunk (su contenido ya debe estar en el texto)
+        """
+        self._ids.append(chunk.id)
+        self._starts.append(chunk.start_index)
+        self._lengths.append(chunk.size)
+        self._pages.append(MISSING if chunk.page_number is None else chunk.page_number)
+        if chunk.sheet_name is None:
+            self._sheets.append(MISSING)
+        else:
+            self._sheets.append(self._sheet_positions.setdefault(chunk.sheet_name, len(self._sheet_positions)))
+        self._row_starts.append(MISSING if chunk.row_start is None else chunk.row_start)
+        self._row_ends.append(MISSING if chunk.row_end is None else chunk.row_end)
+    
+    def build(self) -> ChunkStore:
+        return ChunkStore(
+            text="".join(self._parts),
+            ids=self._ids,
+            starts=self._starts,
+            lengths=self._lengths,
+            pages=self._pages,
+            sheets=self._sheets,
+            sheet_names=list(self._sheet_positions),
+            row_starts=self._row_starts,
+            row_ends=self._row_ends
+        )
@@ -1,5 +1,8 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from .chunk_store import ChunkStore
 
 
 @dataclass
@@ -12,8 +15,14 @@ class Chunk:
     start_index: int
     size: int
     page_number: Optional[int] = None
+    # Solo en hojas de cálculo: hoja y rango de filas del chunk
+    sheet_name: Optional[str] = None
+    row_start: Optional[int] = None
+    row_end: Optional[int] = None
     
     def __repr__(self):
+        if self.sheet_name is not None:
+            return f"Chunk(id={self.id}, size={self.size}, sheet={self.sheet_name}, rows={self.row_start}-{self.row_end})"
         return f"Chunk(id={self.id}, size={self.size}, page={self.page_number})"
 
 
@@ -24,21 +33,31 @@ class Document:
     """
     file_name: str
     file_hash: str
-    full_text: str
-    chunks: List[Chunk]
+    chunks: "ChunkStore"  # Texto una sola vez + posiciones de cada chunk (ver chunk_store.py)
     total_pages: int
     
+    def __post_init__(self):
+        # Una lista de Chunk se pasa al formato compacto
+        from .chunk_store import ChunkStore
+        
+        if not isinstance(self.chunks, ChunkStore):
+            self.chunks = ChunkStore.from_chunks(self.chunks)
+    
     def __repr__(self):
         return f"Document(name={self.file_name}, pages={self.total_pages}, chunks={len(self.chunks)})"
     
+    @property
+    def full_text(self) -> str:
+        """
+        Texto completo del documento (el que comparten todos los chunks)
+        """
+        return self.chunks.text
+    
     def get_chunk_by_id(self, chunk_id: str) -> Optional[Chunk]:
         """
-        Busca un chunk por su ID
+        Busca un chunk por su ID (en tiempo constante)
         """
-        for chunk in self.chunks:
-            if chunk.id == chunk_id:
-                return chunk
-        return None
+        return self.chunks.get(chunk_id)
     
     def get_total_chunks(self) -> int:
         """
@@ -68,6 +87,10 @@ class RetrievalResult:
     chunks: List[str]  # Contenido de los chunks encontrados
     chunk_ids: List[str]  # IDs de los chunks
     distances: List[float]  # Distancias/scores de similitud
+    sources: List[str] = field(default_factory=list)  # Hash del documento de cada chunk
+    page_numbers: List[Optional[int]] = field(default_factory=list)  # Página de cada chunk (si se conoce)
+    scores: List[float] = field(default_factory=list)  # Puntuación de la búsqueda híbrida o del reordenado (mayor = mejor)
+    timings: dict = field(default_factory=dict)  # Tiempos de la búsqueda (p. ej. rerank_ms)
     
     def get_context_text(self) -> str:
         """
@@ -77,3 +100,38 @@ class RetrievalResult:
     
     def __repr__(self):
         return f"RetrievalResult(found={len(self.chunks)} chunks)"
+
+
+@dataclass
+class IngestResult:
+    """
+    Resultado de indexar un archivo dentro de una ingesta por lotes
+    """
+    file_name: str
+    status: str  # "indexado", "ya indexado" o "error"
+    file_hash: Optional[str] = None
+    chunks: int = 0
+    reused: int = 0  # embeddings copiados de la versión anterior del archivo
+    seconds: float = 0.0
+    error: Optional[str] = None
+    
+    def __repr__(self):
+        return f"IngestResult({self.file_name}: {self.status}, chunks={self.chunks})"
+
+
+@dataclass
+class RagAnswer:
+    """
+    Respuesta a una pregunta del pipeline RAG, con sus tiempos por etapa
+    """
+    question: str
+    answer: str = ""
+    retrieval_result: Optional[RetrievalResult] = None
+    from_cache: bool = False
+    attempts: int = 0  # Llamadas al modelo (más de una si hubo reintentos)
+    timings: dict = field(default_factory=dict)  # Etapa -> segundos
+    error: Optional[str] = None
+    
+    def __repr__(self):
+        status = self.error or ("caché" if self.from_cache else "ok")
+        return f"RagAnswer({status}, {len(self.answer)} caracteres)"
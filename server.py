@@ -0,0 +1,203 @@
+"""
+Servidor HTTP local para indexar documentos y hacer preguntas, sin Streamlit
+
+Uso:
+    python server.py --port 8000
+
+Rutas:
+    POST /ingest?name=informe.pdf   cuerpo = bytes del archivo
+    POST /ingest                    {"path": "documentos/informe.pdf"}   (solo dentro de INGEST_ROOT)
+    POST /ask                       {"question": "...", "documents": ["informe.pdf"], "use_cache": true}
+    GET  /documents                 documentos indexados
+    GET  /metrics                   métricas en formato de texto de Prometheus
+    GET  /metrics.json              las mismas métricas en JSON
+
+Las respuestas son JSON. Todas las preguntas comparten un único bucle de
+eventos, así el límite de llamadas simultáneas al modelo
+(LLM_MAX_CONCURRENCY) se aplica a todo el servidor. Pensado para uso
+local y pruebas de carga: no tiene autenticación. Por eso /ingest solo
+acepta rutas dentro de INGEST_ROOT (--ingest-root); si no se configura,
+solo se pueden subir archivos.
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config.settings import settings
+from services.document_service import DocumentService
+from services.ingest_service import SUPPORTED_EXTENSIONS
+from services.metrics_service import metrics
+from services.service_registry import registry
+from services.qa_service import answer_to_dict
+
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+
+class EventLoopThread:
+    """Bucle de eventos en un hilo propio al que los hilos HTTP envían las preguntas"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="rag-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+
+class QAHandler(BaseHTTPRequestHandler):
+    qa_service = None
+    event_loop = None
+    ingest_root = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body_length(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_UPLOAD_BYTES:
+            raise ValueError(f"Archivo demasiado grande (máximo {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+        return length
+
+    def _read_body(self):
+        return self.rfile.read(self._body_length())
+
+    def _read_json_object(self):
+        body = json.loads(self._read_body())
+        if not isinstance(body, dict):
+            raise ValueError("El cuerpo debe ser un objeto JSON")
+        return body
+
+    def _ingest_path(self, path):
+        # Ruta real (sin enlaces ni "..") que debe quedar dentro de la carpeta permitida
+        if not self.ingest_root:
+            raise ValueError("La indexación por ruta está desactivada: sube el archivo o configura INGEST_ROOT")
+        real_path = os.path.realpath(os.path.join(self.ingest_root, path))
+        if os.path.commonpath([real_path, self.ingest_root]) != self.ingest_root:
+            raise ValueError(f"Ruta fuera de la carpeta permitida: {path}")
+        return real_path
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._send_text(200, metrics.export_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/metrics.json":
+            self._send_text(200, metrics.export_json(), "application/json; charset=utf-8")
+        elif path == "/documents":
+            documents = [
+                {"file_hash": doc["file_hash"], "file_name": doc["file_name"], "chunks": doc["total_chunks"]}
+                for doc in self.qa_service.indexed_documents()
+            ]
+            self._send_json(200, {"documents": documents})
+        else:
+            self._send_json(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == "/ingest":
+                self._ingest(parse_qs(url.query))
+            elif url.path == "/ask":
+                self._ask()
+            else:
+                self._send_json(404, {"error": "Ruta no encontrada"})
+        except (ValueError, KeyError, OSError) as e:
+            self._send_json(400, {"error": str(e)})
+
+    def _ingest(self, query):
+        if "name" in query:
+            file_name = os.path.basename(query["name"][0])
+        else:
+            path = self._read_json_object()["path"]
+            if not isinstance(path, str):
+                raise ValueError("\"path\" debe ser una cadena")
+            path = self._ingest_path(path)
+            file_name = os.path.basename(path)
+
+        extension = file_name.rsplit(".", 1)[-1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Formato no soportado: .{extension}")
+
+        if "name" in query:
+            # El cuerpo se copia a un temporal y se calcula su hash en la misma pasada,
+            # sin tener el archivo entero en memoria
+            file, file_hash = DocumentService.spool_file(self.rfile, self._body_length())
+        else:
+            file, file_hash = open(path, "rb"), None
+        with file:
+            result = self.qa_service.index_file(file, file_name, file_hash)
+        payload = {
+            "file_name": result.file_name,
+            "status": result.status,
+            "file_hash": result.file_hash,
+            "chunks": result.chunks,
+            "reused": result.reused,
+            "seconds": result.seconds,
+            "error": result.error
+        }
+        self._send_json(500 if result.status == "error" else 200, payload)
+
+    def _ask(self):
+        request = self._read_json_object()
+        question = request["question"]
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError("La pregunta está vacía")
+        documents = request.get("documents")
+        if documents is not None and (
+            not isinstance(documents, list) or not all(isinstance(doc, str) for doc in documents)
+        ):
+            raise ValueError("\"documents\" debe ser una lista de nombres o hashes")
+        timeout = request.get("timeout")
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))):
+            raise ValueError("\"timeout\" debe ser un número de segundos")
+
+        result = self.event_loop.run(self.qa_service.ask(
+            question,
+            documents=documents,
+            use_cache=bool(request.get("use_cache", True)),
+            timeout=timeout
+        ))
+        self._send_json(200 if result.error is None else 502, answer_to_dict(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP local de preguntas sobre documentos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ingest-root", default=settings.INGEST_ROOT,
+                        help="Carpeta de la que POST /ingest puede leer rutas (por defecto, ninguna)")
+    args = parser.parse_args()
+
+    QAHandler.qa_service = registry.get_qa_service()
+    QAHandler.event_loop = EventLoopThread()
+    QAHandler.ingest_root = os.path.realpath(args.ingest_root) if args.ingest_root else None
+
+    server = ThreadingHTTPServer((args.host, args.port), QAHandler)
+    print(f"Servidor escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
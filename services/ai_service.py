@@ -1,8 +1,10 @@
-import google.generativeai as genai
-from typing import List
+import time
+from typing import Iterator, List, Optional
 
 from models.document import ConversationMessage
 from config.settings import settings
+from services.memory_service import ConversationMemory, estimate_tokens, format_messages
+from services.metrics_service import metrics
 
 
 class AIService:
@@ -10,10 +12,22 @@ class AIService:
     Servicio para comunicarse con Gemini (IA de Google)
     """
     
-    def __init__(self):
+    def __init__(self, model=None):
         """
         Inicializa el cliente de Gemini
+        
+        Args:
+            model: Modelo a usar en lugar de Gemini (p. ej. StubGenerativeModel
+                para pruebas); debe tener generate_content(prompt, stream=...)
         """
+        if model is not None:
+            self.model = model
+            print(f"Modelo local configurado: {type(model).__name__}")
+            return
+        
+        # El cliente de Gemini se importa solo cuando hace falta
+        import google.generativeai as genai
+        
         genai.configure(api_key=settings.GOOGLE_API_KEY)
         self.model = genai.GenerativeModel(settings.GEMINI_MODEL_NAME)
         print(f"Gemini configurado: {settings.GEMINI_MODEL_NAME}")
@@ -22,7 +36,8 @@ class AIService:
         self, 
         context: str, 
         question: str, 
-        history: List[ConversationMessage]
+        history: List[ConversationMessage],
+        memory: Optional[ConversationMemory] = None
     ) -> str:
         """
         Genera una respuesta usando Gemini basándose en el contexto y el historial
@@ -31,19 +46,136 @@ class AIService:
             context: Fragmentos del PDF relevantes
             question: Pregunta actual del usuario
             history: Historial de conversación
+            memory: Memoria acotada de la conversación; si se indica, el
+                historial se recorta a su presupuesto de tokens
             
         Returns:
             Respuesta generada por Gemini
         """
-        # Formatear el historial
-        chat_history_formatted = self._format_history(history)
-        
         # Crear el prompt
-        prompt = self._build_prompt(context, question, chat_history_formatted)
+        prompt = self._prepare_prompt(context, question, history, memory)
         
         # Generar respuesta
-        response = self.model.generate_content(prompt)
+        metrics.increment("llm_calls_total", kind="answer")
+        with metrics.span("generate_response"):
+            response = self.model.generate_content(prompt)
+        
+        return response.text
+    
+    def generate_response_stream(
+        self, 
+        context: str, 
+        question: str, 
+        history: List[ConversationMessage],
+        memory: Optional[ConversationMemory] = None
+    ) -> Iterator[str]:
+        """
+        Igual que generate_response, pero devuelve los fragmentos de la
+        respuesta a medida que Gemini los genera
+        
+        El prompt se construye al llamar al método, así que el historial
+        puede modificarse mientras se consume el iterador.
+        
+        Args:
+            context: Fragmentos del PDF relevantes
+            question: Pregunta actual del usuario
+            history: Historial de conversación
+            memory: Memoria acotada de la conversación (ver generate_response)
+            
+        Returns:
+            Iterador de fragmentos de texto
+        """
+        prompt = self._prepare_prompt(context, question, history, memory)
+        return self.stream_prompt(prompt)
+    
+    def _prepare_prompt(
+        self,
+        context: str,
+        question: str,
+        history: List[ConversationMessage],
+        memory: Optional[ConversationMemory]
+    ) -> str:
+        """
+        Formatea el historial (con la memoria si la hay) y construye el prompt
+        """
+        return self.build_prompt(context, question, self.format_history(history, memory), memory)
+    
+    def format_history(
+        self,
+        history: List[ConversationMessage],
+        memory: Optional[ConversationMemory] = None
+    ) -> str:
+        """
+        Formatea el historial para el prompt, recortado al presupuesto de la
+        memoria si se indica
         
+        No depende del contexto, así que puede hacerse mientras se busca.
+        """
+        if memory is None:
+            return self._format_history(history)
+        return memory.format_history(history)
+    
+    def build_prompt(
+        self,
+        context: str,
+        question: str,
+        history_text: str,
+        memory: Optional[ConversationMemory] = None
+    ) -> str:
+        """
+        Construye el prompt con el historial ya formateado y anota su tamaño
+        en la memoria si se indica
+        """
+        prompt = self._build_prompt(context, question, history_text)
+        metrics.observe("prompt_tokens", estimate_tokens(prompt))
+        metrics.observe("context_tokens", estimate_tokens(context))
+        if memory is not None:
+            memory.record_prompt(prompt)
+        return prompt
+    
+    def stream_prompt(self, prompt: str) -> Iterator[str]:
+        """
+        Llama a Gemini en modo streaming y emite el texto de cada fragmento
+        
+        Args:
+            prompt: Prompt completo
+            
+        Returns:
+            Iterador de fragmentos de texto
+        """
+        metrics.increment("llm_calls_total", kind="stream")
+        start = time.perf_counter()
+        first_token = True
+        try:
+            response = self.model.generate_content(prompt, stream=True)
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Fragmentos sin texto (p. ej. solo metadatos de seguridad)
+                    continue
+                if text:
+                    if first_token:
+                        metrics.record_span("generate.first_token", time.perf_counter() - start)
+                        first_token = False
+                    yield text
+        finally:
+            # También si se deja de leer a mitad (p. ej. al pulsar otro botón)
+            metrics.record_span("generate_response", time.perf_counter() - start)
+    
+    def generate_from_prompt(self, prompt: str) -> str:
+        """
+        Genera la respuesta a un prompt ya construido (un intento de RagPipeline)
+        
+        Args:
+            prompt: Prompt completo (contexto, historial y pregunta)
+            
+        Returns:
+            Respuesta generada por Gemini
+        """
+        metrics.increment("llm_calls_total", kind="pipeline")
+        with metrics.span("generate_response"):
+            response = self.model.generate_content(prompt)
         return response.text
     
     def _format_history(self, history: List[ConversationMessage]) -> str:
@@ -59,11 +191,7 @@ class AIService:
         if not history:
             return "No hay historial previo."
         
-        formatted = ""
-        for msg in history:
-            formatted += f"{msg.role}: {msg.content}\n"
-        
-        return formatted
+        return format_messages(history)
     
     def _build_prompt(self, context: str, question: str, history: str) -> str:
         """
@@ -108,14 +236,20 @@ Instrucciones:
         Returns:
             Respuesta generada
         """
-        response = self.model.generate_content(prompt)
+        metrics.increment("llm_calls_total", kind="simple")
+        with metrics.span("generate_simple_response"):
+            response = self.model.generate_content(prompt)
         return response.text
 
 
 ## Explicación rápida:
 
 ##`generate_response()`**: Método principal que genera respuestas con contexto e historial
+##`generate_response_stream()`**: Igual, pero va entregando la respuesta por fragmentos
 ##`_format_history()`**: Convierte la lista de mensajes en texto legible
+##`format_history()` / `build_prompt()`**: Las dos mitades del prompt por separado (para RagPipeline)
+##`generate_from_prompt()`**: Llama a Gemini con el prompt ya construido por RagPipeline
+##`_prepare_prompt()`**: Usa la memoria acotada (resumen + últimos turnos) si se le pasa
 ##`_build_prompt()`**: Construye el prompt completo que se envía a Gemini
 ##`generate_simple_response()`**: Para preguntas simples sin contexto
 
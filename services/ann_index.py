@@ -0,0 +1,150 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from services.vector_index import normalize_rows
+
+
+class IVFIndex:
+    """
+    Índice aproximado (ANN) de tipo IVF: "inverted file" sobre k-means
+    
+    Los vectores se reparten en nlist grupos (centroides de k-means). Una
+    búsqueda solo compara la consulta con los vectores de los nprobe grupos
+    más cercanos, así que el coste crece mucho más despacio que el número de
+    chunks, a cambio de perder algún vecino (recall < 1).
+    
+    Las listas invertidas se guardan en formato CSR: un único array con los
+    índices de todos los vectores ordenados por grupo y un array de offsets.
+    """
+    
+    # Vectores de entrenamiento por centroide (muestra para k-means)
+    TRAIN_SAMPLES_PER_LIST = 64
+    # Filas por bloque al asignar todos los vectores (limita la memoria)
+    ASSIGN_BLOCK_SIZE = 65536
+    
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        metric: str = "cosine",
+        iterations: int = 10,
+        seed: int = 0
+    ):
+        """
+        Construye el índice
+        
+        Args:
+            vectors: Matriz (n, dim) con los embeddings
+            nlist: Número de grupos (None = 4 * raíz de n)
+            metric: "cosine" o "dot"
+            iterations: Iteraciones de k-means
+            seed: Semilla para que la construcción sea reproducible
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if metric == "cosine":
+            vectors = normalize_rows(vectors)
+        self.metric = metric
+        self.vectors = vectors
+        
+        n = len(vectors)
+        if nlist is None or nlist <= 0:
+            nlist = int(4 * np.sqrt(n))
+        self.nlist = max(1, min(nlist, n))
+        
+        rng = np.random.default_rng(seed)
+        self.centroids = self._train(rng, iterations)
+        
+        assignments = self._assign(self.vectors)
+        counts = np.bincount(assignments, minlength=self.nlist)
+        self.list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    
+    def _train(self, rng: np.random.Generator, iterations: int) -> np.ndarray:
+        """
+        k-means esférico sobre una muestra de los vectores
+        
+        Returns:
+            Matriz (nlist, dim) de centroides normalizados
+        """
+        n = len(self.vectors)
+        sample_size = min(n, self.nlist * self.TRAIN_SAMPLES_PER_LIST)
+        sample = self.vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+        
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assignments, minlength=self.nlist)
+            # Los grupos vacíos conservan su centroide anterior
+            filled = counts > 0
+            starts = (np.cumsum(counts) - counts)[filled]
+            sums = np.add.reduceat(sample[np.argsort(assignments, kind="stable")], starts, axis=0)
+            centroids[filled] = sums / counts[filled, None]
+            centroids = normalize_rows(centroids)
+        
+        return centroids
+    
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Grupo más cercano de cada vector, por bloques
+        """
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), self.ASSIGN_BLOCK_SIZE):
+            block = vectors[start:start + self.ASSIGN_BLOCK_SIZE]
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+    
+    def __len__(self) -> int:
+        return len(self.vectors)
+    
+    def search(self, queries: np.ndarray, k: int, nprobe: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los k vectores (aproximadamente) más cercanos a cada consulta
+        
+        Args:
+            queries: Matriz (q, dim) o vector (dim,) de consultas
+            k: Número de resultados por consulta
+            nprobe: Grupos a explorar por consulta (más = más recall, más lento)
+        
+        Returns:
+            (índices (q, k), distancias (q, k)) con la misma convención que
+            NumpyVectorIndex.search. Si los grupos explorados tienen menos de
+            k vectores, las posiciones sobrantes tienen índice -1.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if self.metric == "cosine":
+            queries = normalize_rows(queries)
+        
+        k = min(k, len(self))
+        nprobe = max(1, min(nprobe, self.nlist))
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        
+        centroid_scores = queries @ self.centroids.T
+        if nprobe < self.nlist:
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(self.nlist), (len(queries), 1))
+        
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([
+                self.list_ids[self.offsets[c]:self.offsets[c + 1]] for c in probes[q]
+            ])
+            if len(candidates) == 0:
+                continue
+            
+            scores = self.vectors[candidates] @ query
+            top_k = min(k, len(candidates))
+            if top_k < len(candidates):
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-scores[top])]
+            
+            indices[q, :top_k] = candidates[top]
+            top_scores = scores[top]
+            distances[q, :top_k] = 1.0 - top_scores if self.metric == "cosine" else -top_scores
+        
+        return indices, distances
@@ -0,0 +1,324 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from models.document import ConversationMessage, RetrievalResult
+from services.lexical_index import COMPOUND, tokenize
+from services.metrics_service import metrics
+
+# Preguntas que dependen de lo hablado antes ("¿y eso?", "explica lo anterior"):
+# su respuesta cambia con el historial, así que no pasan por la caché
+FOLLOW_UP = re.compile(
+    r"^\s*¿?\s*(y|pero|entonces)\b|"
+    r"\b(eso|esto|esa|ese|esas|esos|aquello|anterior|mismo|misma|dicho|dicha|"
+    r"mencionad[oa]s?|antes|también|otra vez)\b",
+    re.IGNORECASE
+)
+
+
+class AnswerCache:
+    """
+    Caché semántica de respuestas
+    
+    Guarda cada respuesta junto al embedding de su pregunta y los documentos
+    consultados. Una pregunta nueva sobre los mismos documentos cuyo
+    embedding se parece lo suficiente (similitud coseno >= threshold) recibe
+    la respuesta guardada sin buscar contexto ni llamar a Gemini.
+    
+    Los números y los identificadores compuestos de la pregunta (PX-1234,
+    v2.3) tienen que coincidir exactamente: el embedding apenas cambia entre
+    "producto 12" y "producto 13", pero la respuesta sí.
+    
+    Las entradas caducan a los ttl_seconds, se expulsan por LRU al pasar de
+    max_entries y, con path, se guardan en SQLite para sobrevivir reinicios.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        path: Optional[str] = None
+    ):
+        """
+        Args:
+            model_name: Modelo de embeddings (vectores de otro modelo no se comparan)
+            threshold: Similitud coseno mínima para reutilizar una respuesta
+            max_entries: Máximo de respuestas guardadas
+            ttl_seconds: Vida de una respuesta (0 = no caduca)
+            path: Ruta del fichero SQLite (None = solo memoria)
+        """
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()  # id -> entrada, de menos a más reciente
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id TEXT PRIMARY KEY, scope TEXT NOT NULL, vector BLOB NOT NULL, "
+                "question TEXT NOT NULL, answer TEXT NOT NULL, sources TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+    
+    def make_scope(self, file_hashes: Iterable[str]) -> str:
+        """
+        Clave de los documentos consultados (el orden no importa)
+        """
+        return self.model_name + "\0" + "|".join(sorted(file_hashes))
+    
+    @staticmethod
+    def identifiers(question: str) -> str:
+        """
+        Números e identificadores compuestos de una pregunta, ordenados y
+        sin repetir (los mismos términos que usa BM25)
+        """
+        terms = {term for term in tokenize(question) if COMPOUND.fullmatch(term) or any(c.isdigit() for c in term)}
+        return "|".join(sorted(terms))
+    
+    @staticmethod
+    def is_cacheable(question: str, history: List[ConversationMessage]) -> bool:
+        """
+        Indica si la respuesta a una pregunta no depende de la conversación
+        
+        Sin historial siempre se puede; con historial solo si la pregunta no
+        hace referencia a lo hablado antes.
+        """
+        return not history or FOLLOW_UP.search(question) is None
+    
+    def lookup(self, file_hashes: Iterable[str], query_vector: np.ndarray, question: str) -> Optional[dict]:
+        """
+        Busca una respuesta guardada para una pregunta parecida
+        
+        Args:
+            file_hashes: Documentos consultados
+            query_vector: Embedding de la pregunta
+            question: Pregunta (sus identificadores deben coincidir)
+        
+        Returns:
+            La entrada más parecida (question, answer, retrieval_result,
+            similarity) o None si ninguna llega al umbral
+        """
+        scope = self.make_scope(file_hashes)
+        identifiers = self.identifiers(question)
+        query = self._normalize(query_vector)
+        now = time.time()
+        
+        with self._lock:
+            self._expire(now)
+            candidates = [
+                entry for entry in self._entries.values()
+                if entry["scope"] == scope and entry["identifiers"] == identifiers
+            ]
+            best = None
+            if candidates:
+                similarities = np.stack([entry["vector"] for entry in candidates]) @ query
+                position = int(np.argmax(similarities))
+                if similarities[position] >= self.threshold:
+                    best = candidates[position]
+            
+            if best is None:
+                self.misses += 1
+                metrics.increment("answer_cache_misses_total")
+                return None
+            
+            self.hits += 1
+            metrics.increment("answer_cache_hits_total")
+            best["last_used"] = now
+            self._entries.move_to_end(best["id"])
+            if self._db is not None:
+                self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best["id"]))
+                self._db.commit()
+            return {
+                "question": best["question"],
+                "answer": best["answer"],
+                "retrieval_result": self._to_retrieval_result(best["sources"]),
+                "similarity": float(similarities[position])
+            }
+    
+    def put(
+        self,
+        file_hashes: Iterable[str],
+        query_vector: np.ndarray,
+        question: str,
+        answer: str,
+        retrieval_result: Optional[RetrievalResult] = None
+    ) -> None:
+        """
+        Guarda una respuesta (sustituye a la de una pregunta casi idéntica)
+        
+        Args:
+            file_hashes: Documentos consultados
+            query_vector: Embedding de la pregunta
+            question: Pregunta
+            answer: Respuesta completa
+            retrieval_result: Contexto usado, para mostrarlo en los aciertos
+        """
+        scope = self.make_scope(file_hashes)
+        identifiers = self.identifiers(question)
+        vector = self._normalize(query_vector)
+        now = time.time()
+        sources = self._from_retrieval_result(retrieval_result)
+        
+        with self._lock:
+            # Una respuesta nueva (p. ej. al saltarse la caché) reemplaza a la anterior
+            for entry in list(self._entries.values()):
+                if (entry["scope"] == scope and entry["identifiers"] == identifiers
+                        and float(entry["vector"] @ vector) >= self.threshold):
+                    self._delete(entry["id"])
+            
+            entry = {
+                "id": uuid.uuid4().hex,
+                "scope": scope,
+                "vector": vector,
+                "identifiers": identifiers,
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "created_at": now,
+                "last_used": now
+            }
+            self._entries[entry["id"]] = entry
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry["id"], scope, vector.tobytes(), question, answer,
+                     json.dumps(sources), now, now)
+                )
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+            if self._db is not None:
+                self._db.commit()
+    
+    def record_bypass(self) -> None:
+        """
+        Cuenta una pregunta que no pasó por la caché (a petición o por
+        depender del historial)
+        """
+        with self._lock:
+            self.bypassed += 1
+            metrics.increment("answer_cache_bypassed_total")
+    
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    @staticmethod
+    def _from_retrieval_result(retrieval_result: Optional[RetrievalResult]) -> dict:
+        if retrieval_result is None:
+            return {"chunks": [], "sources": [], "page_numbers": []}
+        return {
+            "chunks": list(retrieval_result.chunks),
+            "sources": list(retrieval_result.sources),
+            "page_numbers": list(retrieval_result.page_numbers)
+        }
+    
+    @staticmethod
+    def _to_retrieval_result(sources: dict) -> RetrievalResult:
+        return RetrievalResult(
+            chunks=sources["chunks"],
+            chunk_ids=[],
+            distances=[],
+            sources=sources["sources"],
+            page_numbers=sources["page_numbers"]
+        )
+    
+    def _expire(self, now: float) -> None:
+        """
+        Elimina las entradas caducadas (con el lock tomado)
+        """
+        if self.ttl_seconds <= 0:
+            return
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            self._delete(key)
+        if expired and self._db is not None:
+            self._db.commit()
+    
+    def _delete(self, key: str) -> None:
+        """
+        Elimina una entrada de memoria y de disco (con el lock tomado, sin commit)
+        """
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM answers WHERE id = ?", (key,))
+    
+    def _load(self) -> None:
+        """
+        Carga las respuestas guardadas en disco, de menos a más usada
+        """
+        cursor = self._db.execute(
+            "SELECT id, scope, vector, question, answer, sources, created_at, last_used "
+            "FROM answers ORDER BY last_used"
+        )
+        for key, scope, blob, question, answer, sources, created_at, last_used in cursor:
+            self._entries[key] = {
+                "id": key,
+                "scope": scope,
+                "vector": np.frombuffer(blob, dtype=np.float32),
+                "identifiers": self.identifiers(question),  # Se recalculan de la pregunta guardada
+                "question": question,
+                "answer": answer,
+                "sources": json.loads(sources),
+                "created_at": created_at,
+                "last_used": last_used
+            }
+        with self._lock:
+            self._expire(time.time())
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+            self._db.commit()
+        print(f"Caché de respuestas: {len(self._entries)} respuestas cargadas de disco")
+    
+    def get_stats(self) -> dict:
+        """
+        Obtiene los contadores de la caché
+        
+        Returns:
+            Diccionario con aciertos, fallos, preguntas sin caché, tasa de
+            acierto y número de respuestas guardadas
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "disk_enabled": self._db is not None
+        }
+    
+    def clear(self) -> None:
+        """
+        Vacía la caché (memoria y disco) y reinicia los contadores
+        """
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+            self.hits = self.misses = self.bypassed = 0
@@ -0,0 +1,206 @@
+import abc
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import settings
+
+# Un chunk se representa como (inicio, fin) dentro del texto: crear tuplas de
+# enteros es mucho más barato que copiar substrings mientras se trocea
+Span = Tuple[int, int]
+
+# Final de frase (., !, ?, … seguidos de espacio) o de párrafo (línea en blanco)
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
+
+
+class Chunker(abc.ABC):
+    """
+    Estrategia de troceado: convierte un texto en spans (inicio, fin)
+    """
+    
+    name = "base"
+    
+    @abc.abstractmethod
+    def split(self, text: str) -> List[Span]:
+        """
+        Trocea un texto en spans (inicio, fin), en orden
+        """
+    
+    def split_many(self, texts: Sequence[str]) -> List[List[Span]]:
+        """
+        Trocea varios textos (las estrategias con tokenizador lo hacen en lote)
+        """
+        return [self.split(text) for text in texts]
+
+
+class FixedCharChunker(Chunker):
+    """
+    Ventanas de tamaño fijo en caracteres (el comportamiento original)
+    """
+    
+    name = "fixed"
+    
+    def __init__(self, size: int, overlap: int):
+        if overlap >= size:
+            raise ValueError("CHUNK_OVERLAP debe ser menor que CHUNK_SIZE")
+        self.size = size
+        self.overlap = overlap
+    
+    def split(self, text: str) -> List[Span]:
+        length = len(text)
+        return [(start, min(start + self.size, length)) for start in range(0, length, self.size - self.overlap)]
+
+
+class SentenceChunker(Chunker):
+    """
+    Agrupa frases y párrafos completos hasta llenar el tamaño, sin cortar
+    palabras ni frases (salvo frases más largas que un chunk, que se parten
+    en ventanas fijas). El solapamiento se hace con frases enteras.
+    """
+    
+    name = "sentence"
+    
+    def __init__(self, size: int, overlap: int):
+        self.size = size
+        self.overlap = overlap
+        self._fallback = FixedCharChunker(size, min(overlap, size - 1))
+    
+    def _sentences(self, text: str) -> List[Span]:
+        spans = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            if match.start() > start:
+                spans.append((start, match.start()))
+            start = match.end()
+        if start < len(text):
+            spans.append((start, len(text)))
+        return spans
+    
+    def split(self, text: str) -> List[Span]:
+        sentences = []
+        for start, end in self._sentences(text):
+            if end - start > self.size:
+                sentences.extend((start + a, start + b) for a, b in self._fallback.split(text[start:end]))
+            else:
+                sentences.append((start, end))
+        
+        spans = []
+        first = 0
+        while first < len(sentences):
+            # Añadir frases mientras quepan
+            last = first
+            while last + 1 < len(sentences) and sentences[last + 1][1] - sentences[first][0] <= self.size:
+                last += 1
+            spans.append((sentences[first][0], sentences[last][1]))
+            if last + 1 >= len(sentences):
+                break
+            
+            # La siguiente ventana empieza con las últimas frases que quepan en el solapamiento
+            next_first = last + 1
+            while next_first - 1 > first and sentences[last][1] - sentences[next_first - 1][0] <= self.overlap:
+                next_first -= 1
+            first = next_first
+        return spans
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name: str):
+    """
+    Carga (una vez por proceso) el tokenizador rápido del modelo de embeddings
+    """
+    from transformers import AutoTokenizer
+    
+    repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return AutoTokenizer.from_pretrained(repo, use_fast=True)
+
+
+class TokenChunker(Chunker):
+    """
+    Ventanas medidas en tokens del propio modelo de embeddings, para que
+    ningún chunk pase del límite del modelo y se trunque al generar su
+    embedding. Los cortes se hacen en fronteras de token (nunca a mitad de
+    palabra) usando los offsets del tokenizador.
+    """
+    
+    name = "token"
+    
+    def __init__(self, max_tokens: int, overlap_tokens: int, model_name: str):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("CHUNK_OVERLAP_TOKENS debe ser menor que CHUNK_MAX_TOKENS")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.model_name = model_name
+    
+    def split(self, text: str) -> List[Span]:
+        return self.split_many([text])[0]
+    
+    def split_many(self, texts: Sequence[str]) -> List[List[Span]]:
+        # Una sola llamada al tokenizador (en Rust, en paralelo) para todo el lote
+        encodings = load_tokenizer(self.model_name)(
+            list(texts),
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )
+        return [self._windows(np.asarray(offsets, dtype=np.int64).reshape(-1, 2))
+                for offsets in encodings["offset_mapping"]]
+    
+    def _windows(self, offsets: np.ndarray) -> List[Span]:
+        n_tokens = len(offsets)
+        if n_tokens == 0:
+            # Texto vacío o solo espacios
+            return []
+        
+        # Ventanas calculadas de una vez con aritmética de arrays
+        starts = np.arange(0, n_tokens, self.max_tokens - self.overlap_tokens)
+        ends = np.minimum(starts + self.max_tokens, n_tokens)
+        # La última ventana completa ya cubre el final: no crear ventanas que solo sean solapamiento
+        keep = np.concatenate([[True], ends[:-1] < n_tokens])
+        starts, ends = starts[keep], ends[keep]
+        return list(zip(offsets[starts, 0].tolist(), offsets[ends - 1, 1].tolist()))
+
+
+def get_chunker(strategy: Optional[str] = None) -> Chunker:
+    """
+    Crea el chunker configurado en settings.CHUNK_STRATEGY
+    
+    Args:
+        strategy: "fixed", "sentence" o "token" (None = el de settings)
+    """
+    strategy = strategy or settings.CHUNK_STRATEGY
+    if strategy == "fixed":
+        return FixedCharChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    if strategy == "sentence":
+        return SentenceChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    if strategy == "token":
+        return TokenChunker(settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS, settings.EMBEDDING_MODEL_NAME)
+    raise ValueError(f"Estrategia de troceado desconocida: {strategy}")
+
+
+def chunk_stats(sizes: Sequence[int]) -> dict:
+    """
+    Estadísticas de tamaño de un conjunto de chunks
+    
+    Args:
+        sizes: Tamaño (en caracteres) de cada chunk
+    
+    Returns:
+        Diccionario con número de chunks y tamaños total, medio, mínimo,
+        máximo, p50 y p95
+    """
+    if not len(sizes):
+        return {"count": 0, "total_chars": 0, "mean": 0.0, "min": 0, "max": 0, "p50": 0.0, "p95": 0.0}
+    
+    array = np.asarray(sizes)
+    return {
+        "count": int(len(array)),
+        "total_chars": int(array.sum()),
+        "mean": float(array.mean()),
+        "min": int(array.min()),
+        "max": int(array.max()),
+        "p50": float(np.percentile(array, 50)),
+        "p95": float(np.percentile(array, 95))
+    }
@@ -1,5 +1,6 @@
-from typing import List
+from typing import Callable, List, Optional
 from models.document import ConversationMessage
+from services.memory_service import ConversationMemory
 
 
 class ConversationService:
@@ -7,11 +8,17 @@ class ConversationService:
     Servicio para manejar el historial de conversación
     """
     
-    def __init__(self):
+    def __init__(self, summarize: Optional[Callable[[str], str]] = None):
         """
         Inicializa el historial vacío
+        
+        Args:
+            summarize: Función opcional para resumir los turnos antiguos
+                (p. ej. AIService.generate_simple_response)
         """
         self.history: List[ConversationMessage] = []
+        # Lo que entra en el prompt: el historial completo solo se usa para mostrarlo
+        self.memory = ConversationMemory(summarize=summarize)
         print("Servicio de conversación inicializado")
     
     def add_message(self, role: str, content: str) -> None:
@@ -57,8 +64,18 @@ class ConversationService:
         Limpia todo el historial
         """
         self.history = []
+        self.memory.clear()
         print("Historial limpiado")
     
+    def get_memory_stats(self) -> dict:
+        """
+        Obtiene el tamaño del historial y del prompt en cada turno
+        
+        Returns:
+            Estadísticas de ConversationMemory.get_stats()
+        """
+        return self.memory.get_stats()
+    
     def get_last_n_messages(self, n: int) -> List[ConversationMessage]:
         """
         Obtiene los últimos N mensajes
@@ -1,129 +1,799 @@
-import chromadb
-from typing import List, Optional
+import os
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Union
 
 from models.document import Document, Chunk, RetrievalResult
 from services.embedding_service import EmbeddingService
+from services.vector_index import NumpyVectorIndex
+from services.ann_index import IVFIndex
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from services.rerank_service import RerankService
+from services.metrics_service import Stopwatch, metrics
 from config.settings import settings
 
 
 class DatabaseService:
     """
     Servicio para manejar ChromaDB (base de datos vectorial)
+    
+    Cada documento vive en su propia colección, identificada por el hash del
+    archivo. Una misma instancia se comparte entre todas las sesiones: las
+    colecciones no se modifican una vez completas, y cada sesión indica en
+    cada consulta qué documentos quiere usar.
     """
     
-    def __init__(self, embedding_service: EmbeddingService):
+    def __init__(self, embedding_service: EmbeddingService, reranker: Optional[RerankService] = None):
         """
-        Inicializa el cliente de ChromaDB
+        Inicializa el cliente persistente de ChromaDB
+        
+        Args:
+            embedding_service: Servicio de embeddings
+            reranker: Cross-encoder opcional para reordenar los candidatos
         """
-        self.client = chromadb.Client()
+        import chromadb
+        
+        self.client = chromadb.PersistentClient(path=settings.VECTOR_STORE_PATH)
         self.embedding_service = embedding_service
-        self.collection = None
-        print("Base de datos ChromaDB inicializada")
+        self.reranker = reranker
+        self._collections: Dict[str, object] = {}  # file_hash -> colección
+        self._vector_indexes: Dict[str, NumpyVectorIndex] = {}  # file_hash -> índice NumPy
+        self._lexical_indexes: Dict[str, BM25Index] = {}  # file_hash -> índice BM25
+        self._ivf_indexes: "OrderedDict[tuple, IVFIndex]" = OrderedDict()  # documentos -> índice IVF
+        self._lock = threading.Lock()
+        self._document_locks: Dict[str, threading.Lock] = {}  # file_hash -> lock de indexación
+        print(f"Base de datos ChromaDB inicializada en '{settings.VECTOR_STORE_PATH}'")
+    
+    @staticmethod
+    def collection_name(file_hash: str) -> str:
+        """
+        Nombre de la colección de un documento (derivado de su hash SHA-256)
+        
+        Args:
+            file_hash: Hash del archivo
+        
+        Returns:
+            Nombre válido para ChromaDB
+        """
+        return f"doc_{file_hash[:40]}"
+    
+    @staticmethod
+    def index_config() -> dict:
+        """
+        Modelo de embeddings y troceado con los que se construyen las
+        colecciones (se guardan en sus metadatos)
+        """
+        if settings.CHUNK_STRATEGY == "token":
+            size, overlap = settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS
+        else:
+            size, overlap = settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+        return {
+            "embedding_model": settings.EMBEDDING_MODEL_NAME,
+            "chunk_strategy": settings.CHUNK_STRATEGY,
+            "chunk_size": size,
+            "chunk_overlap": overlap
+        }
+    
+    def _is_current(self, metadata: dict) -> bool:
+        """
+        Indica si una colección se construyó con la configuración actual
+        (sus vectores no se pueden comparar con los de otro modelo)
+        """
+        return all(metadata.get(key) == value for key, value in self.index_config().items())
+    
+    def _get_stored_collection(self, file_hash: str):
+        """
+        Devuelve la colección guardada de un documento, o None si no existe,
+        quedó a medio escribir o se construyó con otro modelo o troceado
+        """
+        collection = self._collections.get(file_hash)
+        if collection is not None:
+            return collection
+        
+        try:
+            collection = self.client.get_collection(name=self.collection_name(file_hash))
+        except Exception:
+            return None
+        
+        metadata = collection.metadata or {}
+        if not metadata.get("complete") or not self._is_current(metadata):
+            return None
+        
+        with self._lock:
+            self._collections[file_hash] = collection
+        return collection
+    
+    def has_document(self, file_hash: str) -> bool:
+        """
+        Indica si el documento ya está indexado en disco
+        
+        Args:
+            file_hash: Hash del archivo
+        
+        Returns:
+            True si existe una colección completa para ese hash
+        """
+        return self._get_stored_collection(file_hash) is not None
+    
+    def load_collection(self, file_hash: str) -> bool:
+        """
+        Prepara la colección ya guardada de un documento, sin volver a
+        extraer ni generar embeddings
+        
+        Args:
+            file_hash: Hash del archivo
+        
+        Returns:
+            True si el documento estaba guardado y se ha cargado
+        """
+        collection = self._get_stored_collection(file_hash)
+        if collection is None:
+            return False
+        
+        self._touch(collection)
+        print(f"Colección '{collection.name}' cargada desde disco ({collection.count()} chunks)")
+        return True
+    
+    def _touch(self, collection) -> None:
+        """
+        Actualiza la fecha de último uso de una colección (para la expulsión)
+        """
+        metadata = dict(collection.metadata or {})
+        metadata["last_used"] = time.time()
+        collection.modify(metadata=metadata)
     
-    def create_collection(self, document: Document) -> None:
+    def create_collection(
+        self,
+        document: Document,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> dict:
         """
-        Crea una colección en ChromaDB con los chunks del documento
+        Crea la colección en ChromaDB con los chunks del documento
+        
+        Los embeddings se generan y se guardan por lotes, así la memoria no
+        crece con el tamaño del documento. Si el documento ya está indexado
+        no se vuelve a construir.
+        
+        Si ya existe una versión anterior del mismo archivo (mismo nombre,
+        otro hash), los chunks que no han cambiado (mismo ID de contenido)
+        copian su embedding de esa versión y solo se calculan los nuevos;
+        los chunks eliminados simplemente no pasan a la nueva colección.
+        La versión anterior no se modifica (otras sesiones pueden estar
+        usándola) y se expulsa del almacén como cualquier otro documento.
+        
+        Dos llamadas con el mismo documento a la vez (la misma subida desde
+        dos sesiones) se ejecutan una detrás de otra: la segunda encuentra la
+        colección ya completa en lugar de borrarla a medio escribir.
         
         Args:
             document: Documento con sus chunks a almacenar
+            progress_callback: Función opcional (chunks hechos, total) que se
+                llama después de guardar cada lote
+        
+        Returns:
+            Diccionario con total_chunks, reused (embeddings reutilizados de
+            la versión anterior), embedded (embeddings calculados) y
+            already_indexed (True si el documento ya estaba indexado)
+        """
+        with self._document_lock(document.file_hash):
+            if self.load_collection(document.file_hash):
+                total = self._collections[document.file_hash].count()
+                return {"total_chunks": total, "reused": 0, "embedded": 0, "already_indexed": True}
+            return self._build_collection(document, progress_callback)
+    
+    def _document_lock(self, file_hash: str) -> threading.Lock:
         """
-        # Eliminar colección anterior si existe
+        Lock propio de un documento, para no indexar el mismo hash dos veces a la vez
+        """
+        with self._lock:
+            return self._document_locks.setdefault(file_hash, threading.Lock())
+    
+    def _build_collection(
+        self,
+        document: Document,
+        progress_callback: Optional[Callable[[int, int], None]]
+    ) -> dict:
+        """
+        Construye la colección de un documento que no está indexado (se llama
+        con el lock del documento tomado)
+        """
+        name = self.collection_name(document.file_hash)
+        previous = self._find_previous_version(document)
+        
+        # Eliminar una colección incompleta (o de otro modelo) del mismo documento si existe
         try:
-            self.client.delete_collection(settings.COLLECTION_NAME)
-            print(f"Colección anterior '{settings.COLLECTION_NAME}' eliminada")
-        except:
+            self.client.delete_collection(name)
+            print(f"Colección incompleta o desactualizada '{name}' eliminada")
+        except Exception:
             pass
+        # Y los índices NumPy/BM25 que se hubieran construido a partir de ella
+        with self._lock:
+            self._vector_indexes.pop(document.file_hash, None)
+            self._lexical_indexes.pop(document.file_hash, None)
+        self._delete_vector_index(document.file_hash)
         
-        # Crear nueva colección
-        self.collection = self.client.create_collection(name=settings.COLLECTION_NAME)
-        print(f"Nueva colección '{settings.COLLECTION_NAME}' creada")
-        
-        # Preparar datos
-        texts = [chunk.content for chunk in document.chunks]
-        chunk_ids = [chunk.id for chunk in document.chunks]
+        # Crear nueva colección (se marca completa al terminar de escribir)
+        now = time.time()
+        collection = self.client.create_collection(
+            name=name,
+            metadata={
+                "file_hash": document.file_hash,
+                "file_name": document.file_name,
+                "created_at": now,
+                "last_used": now,
+                "complete": False,
+                **self.index_config()
+            }
+        )
+        print(f"Nueva colección '{name}' creada")
         
-        # Generar embeddings
-        print(f"Generando embeddings para {len(texts)} chunks...")
-        embeddings = self.embedding_service.encode_batch(texts)
+        chunks = document.chunks
+        texts = chunks.contents()
+        total = len(texts)
+        done = 0
+        reused = 0
+        start = time.perf_counter()
+        embedding_time = Stopwatch()
+        store_time = Stopwatch()
         
-        # Preparar metadatos
-        metadatas = [
-            {
-                "chunk_index": i,
-                "start_index": chunk.start_index,
-                "chunk_size": chunk.size
+        def reuse_previous(positions: List[int]) -> Dict[int, np.ndarray]:
+            # Embeddings de la versión anterior para los chunks de este lote que no han cambiado
+            nonlocal reused
+            if previous is None:
+                return {}
+            position_by_id = {chunks.ids[i]: i for i in positions}
+            data = previous.get(ids=list(position_by_id), include=["embeddings"])
+            found = {
+                position_by_id[chunk_id]: np.asarray(embedding, dtype=np.float32)
+                for chunk_id, embedding in zip(data["ids"], data["embeddings"])
             }
-            for i, chunk in enumerate(document.chunks)
-        ]
+            reused += len(found)
+            return found
         
-        # Agregar a la colección
-        self.collection.add(
-            documents=texts,
-            embeddings=embeddings,
-            ids=chunk_ids,
-            metadatas=metadatas
-        )
+        # Generar embeddings (solo los que faltan) y guardarlos lote a lote
+        print(f"Generando embeddings para {total} chunks...")
+        batches = self.embedding_service.iter_encode_batches(texts, known=reuse_previous)
+        for positions, embeddings in embedding_time.wrap(batches):
+            with store_time:
+                collection.add(
+                    documents=[texts[i] for i in positions],
+                    embeddings=embeddings,
+                    ids=[chunks.ids[i] for i in positions],
+                    metadatas=[self._chunk_metadata(i, chunks[i]) for i in positions]
+                )
+            done += len(positions)
+            if progress_callback is not None:
+                progress_callback(done, total)
+        metrics.record_span("create_collection.embed", embedding_time.elapsed)
+        metrics.record_span("create_collection.store", store_time.elapsed)
+        
+        # Índice léxico (BM25) para la búsqueda híbrida, con los mismos chunks
+        with metrics.span("create_collection.lexical_index"):
+            self._build_lexical_index(
+                document.file_hash,
+                texts,
+                chunks.ids,
+                chunks.page_numbers()
+            )
+        
+        metadata = dict(collection.metadata or {})
+        metadata["complete"] = True
+        collection.modify(metadata=metadata)
         
-        print(f"Colección creada con {len(texts)} chunks")
+        with self._lock:
+            self._collections[document.file_hash] = collection
+        
+        print(f"Colección creada con {total} chunks ({reused} embeddings reutilizados)")
+        metrics.record_span("create_collection", time.perf_counter() - start)
+        metrics.increment("chunks_indexed_total", total)
+        metrics.increment("embeddings_computed_total", total - reused)
+        metrics.increment("embeddings_reused_total", reused)
+        
+        self._evict_old_documents(keep=name)
+        return {"total_chunks": total, "reused": reused, "embedded": total - reused, "already_indexed": False}
     
-    def retrieve_context(self, query: str, k: Optional[int] = None) -> RetrievalResult:
+    def _find_previous_version(self, document: Document):
+        """
+        Busca la versión más reciente ya indexada de un archivo con el mismo
+        nombre y distinto contenido
+        
+        Returns:
+            Su colección, o None si no hay ninguna
+        """
+        versions = [
+            doc for doc in self.list_documents()
+            if doc["file_name"] == document.file_name and doc["file_hash"] != document.file_hash
+        ]
+        for doc in sorted(versions, key=lambda d: d["created_at"], reverse=True):
+            collection = self._get_stored_collection(doc["file_hash"])
+            if collection is not None:
+                print(f"Versión anterior de '{document.file_name}' encontrada: {collection.name}")
+                return collection
+        return None
+    
+    @staticmethod
+    def _chunk_metadata(chunk_index: int, chunk: Chunk) -> dict:
+        """
+        Metadatos que se guardan en ChromaDB junto a cada chunk
+        """
+        metadata = {
+            "chunk_index": chunk_index,
+            "start_index": chunk.start_index,
+            "chunk_size": chunk.size
+        }
+        # ChromaDB no admite None en los metadatos
+        if chunk.page_number is not None:
+            metadata["page_number"] = chunk.page_number
+        if chunk.sheet_name is not None:
+            metadata["sheet_name"] = chunk.sheet_name
+            metadata["row_start"] = chunk.row_start
+            metadata["row_end"] = chunk.row_end
+        return metadata
+    
+    def retrieve_context(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        file_hashes: Optional[Union[str, Iterable[str]]] = None
+    ) -> RetrievalResult:
         """
         Busca los chunks más relevantes para una pregunta
         
         Args:
             query: Pregunta del usuario
-            k: Número de chunks a recuperar (usa settings.RETRIEVAL_TOP_K por defecto)
-            
+            k: Número de chunks a recuperar (por defecto settings.RETRIEVAL_TOP_K,
+                o settings.RERANK_TOP_K si hay reordenado)
+            file_hashes: Hash del documento, o lista de hashes, en los que buscar
+        
+        Returns:
+            RetrievalResult con los chunks encontrados (los k mejores entre
+            todos los documentos)
+        """
+        return self.retrieve_context_batch([query], k=k, file_hashes=file_hashes)[0]
+    
+    def retrieve_context_batch(
+        self,
+        queries: List[str],
+        k: Optional[int] = None,
+        file_hashes: Optional[Union[str, Iterable[str]]] = None
+    ) -> List[RetrievalResult]:
+        """
+        Igual que retrieve_context, pero para varias preguntas a la vez
+        (un solo lote de embeddings y una búsqueda por documento)
+        
+        Args:
+            queries: Preguntas
+            k: Número de chunks a recuperar por pregunta
+            file_hashes: Hash del documento, o lista de hashes, en los que buscar
+        
         Returns:
-            RetrievalResult con los chunks encontrados
+            Un RetrievalResult por pregunta, en el mismo orden
         """
-        if self.collection is None:
-            raise ValueError("No hay colección creada. Primero procesa un PDF.")
+        if isinstance(file_hashes, str):
+            file_hashes = [file_hashes]
+        file_hashes = list(file_hashes or [])
+        
+        if not file_hashes:
+            raise ValueError("No hay documentos seleccionados. Primero procesa un archivo.")
         
         if k is None:
-            k = settings.RETRIEVAL_TOP_K
+            k = settings.RERANK_TOP_K if self.reranker is not None else settings.RETRIEVAL_TOP_K
+        
+        # Con reordenado se buscan más candidatos y el cross-encoder elige los k mejores
+        final_k = k
+        if self.reranker is not None:
+            k = max(k, settings.RERANK_CANDIDATES)
+        
+        # En modo híbrido cada búsqueda trae más candidatos para que la fusión pueda elegir
+        hybrid = settings.RETRIEVAL_MODE == "hybrid"
+        fetch_k = max(k, settings.HYBRID_CANDIDATES) if hybrid else k
+        
+        start = time.perf_counter()
+        
+        # Generar los embeddings de las preguntas (una sola vez para todos los documentos)
+        with metrics.span("retrieve.embed_query"):
+            query_embeddings = self.embedding_service.encode_array(queries)
+        
+        with metrics.span("retrieve.vector_search"):
+            # Modo aproximado: un único índice IVF sobre todos los documentos
+            candidates = None
+            if settings.VECTOR_BACKEND == "ivf":
+                candidates = self._search_ivf(file_hashes, query_embeddings, fetch_k)
+        
+            # Buscar en cada documento y quedarse con los más cercanos
+            if candidates is None:
+                candidates = [[] for _ in queries]
+                for file_hash in file_hashes:
+                    for query_candidates, found in zip(candidates, self._search_document(file_hash, query_embeddings, fetch_k)):
+                        query_candidates.extend(found)
+        
+        results = []
+        lexical_time = Stopwatch()
+        for query, query_candidates in zip(queries, candidates):
+            query_candidates.sort(key=lambda candidate: candidate[0])
+            query_candidates = query_candidates[:fetch_k]
+            
+            if hybrid:
+                with lexical_time:
+                    lexical_candidates = self._search_lexical(file_hashes, query, fetch_k)
+                results.append(self._fuse(query_candidates, lexical_candidates, k))
+                continue
+            
+            query_candidates = query_candidates[:k]
+            
+            # Crear objeto RetrievalResult
+            results.append(RetrievalResult(
+                chunks=[c[1] for c in query_candidates],
+                chunk_ids=[c[2] for c in query_candidates],
+                distances=[c[0] for c in query_candidates],
+                sources=[c[3] for c in query_candidates],
+                page_numbers=[c[4] for c in query_candidates]
+            ))
+        
+        if hybrid:
+            metrics.record_span("retrieve.lexical_search", lexical_time.elapsed)
+        
+        if self.reranker is not None:
+            with metrics.span("retrieve.rerank"):
+                results = self.reranker.rerank(queries, results, final_k)
+        
+        metrics.record_span("retrieve_context", time.perf_counter() - start)
+        
+        print(f"Recuperados chunks para {len(queries)} pregunta(s) en {len(file_hashes)} documento(s)")
+        
+        return results
+    
+    def _search_lexical(self, file_hashes: List[str], query: str, k: int) -> List[tuple]:
+        """
+        Busca con BM25 en los documentos y devuelve los k mejores
+        
+        Returns:
+            Lista de (puntuación, texto, id, file_hash, página), de mayor a
+            menor puntuación
+        """
+        found = []
+        for file_hash in file_hashes:
+            index = self._get_lexical_index(file_hash, self._require_collection(file_hash))
+            rows, scores = index.search(query, k)
+            found.extend(
+                (float(score), index.texts[i], index.ids[i], file_hash, index.pages[i])
+                for i, score in zip(rows, scores)
+            )
+        found.sort(key=lambda candidate: -candidate[0])
+        return found[:k]
+    
+    @staticmethod
+    def _fuse(vector_candidates: List[tuple], lexical_candidates: List[tuple], k: int) -> RetrievalResult:
+        """
+        Une los resultados vectoriales y léxicos con Reciprocal Rank Fusion
+        
+        Args:
+            vector_candidates: (distancia, texto, id, file_hash, página), de más a menos cercano
+            lexical_candidates: (puntuación, texto, id, file_hash, página), de mayor a menor
+            k: Chunks a devolver
         
-        # Generar embedding de la pregunta
-        query_embedding = self.embedding_service.encode_text(query)
+        Returns:
+            RetrievalResult con los k mejores; la distancia es la vectorial
+            (infinito si el chunk solo lo encontró BM25)
+        """
+        by_key = {}
+        for candidate in lexical_candidates + vector_candidates:
+            by_key[(candidate[3], candidate[2])] = candidate
+        distances = {(c[3], c[2]): c[0] for c in vector_candidates}
         
-        # Buscar en la colección
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k
+        fused = reciprocal_rank_fusion(
+            [[(c[3], c[2]) for c in vector_candidates], [(c[3], c[2]) for c in lexical_candidates]],
+            k=settings.RRF_K
+        )[:k]
+        chosen = [by_key[key] for key, _ in fused]
+        return RetrievalResult(
+            chunks=[c[1] for c in chosen],
+            chunk_ids=[c[2] for c in chosen],
+            distances=[distances.get(key, float("inf")) for key, _ in fused],
+            sources=[c[3] for c in chosen],
+            page_numbers=[c[4] for c in chosen],
+            scores=[score for _, score in fused]
         )
+    
+    def _search_document(self, file_hash: str, query_embeddings: np.ndarray, k: int) -> List[list]:
+        """
+        Busca en un documento con el backend configurado (settings.VECTOR_BACKEND)
         
-        # Crear objeto RetrievalResult
-        retrieval_result = RetrievalResult(
-            chunks=results["documents"][0],
-            chunk_ids=results["ids"][0],
-            distances=results["distances"][0] if "distances" in results else []
+        Args:
+            file_hash: Hash del documento
+            query_embeddings: Matriz (q, dim) de preguntas
+            k: Resultados por pregunta
+        
+        Returns:
+            Por cada pregunta, lista de (distancia, texto, id, file_hash, página)
+        """
+        collection = self._require_collection(file_hash)
+        
+        if settings.VECTOR_BACKEND in ("numpy", "ivf"):
+            index = self._get_vector_index(file_hash, collection)
+            indices, distances = index.search(query_embeddings, k)
+            return [
+                [(float(d), index.texts[i], index.ids[i], file_hash, index.pages[i]) for i, d in zip(row, row_distances)]
+                for row, row_distances in zip(indices, distances)
+            ]
+        
+        n_results = min(k, collection.count())
+        if n_results == 0:
+            return [[] for _ in query_embeddings]
+        
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results
         )
+        found = []
+        for q in range(len(query_embeddings)):
+            distances = results["distances"][q] if results.get("distances") else [0.0] * n_results
+            metadatas = results["metadatas"][q] if results.get("metadatas") else [{}] * n_results
+            found.append([
+                (distance, text, chunk_id, file_hash, (metadata or {}).get("page_number"))
+                for text, chunk_id, distance, metadata
+                in zip(results["documents"][q], results["ids"][q], distances, metadatas)
+            ])
+        return found
+    
+    def _require_collection(self, file_hash: str):
+        """
+        Como _get_stored_collection, pero falla si el documento no está indexado
+        """
+        collection = self._get_stored_collection(file_hash)
+        if collection is None:
+            raise ValueError(f"El documento {file_hash[:12]} no está indexado.")
+        return collection
+    
+    def _search_ivf(self, file_hashes: List[str], query_embeddings: np.ndarray, k: int) -> Optional[List[list]]:
+        """
+        Busca con un índice IVF construido sobre la unión de los documentos
+        (se guarda en memoria para ese mismo conjunto de documentos)
+        
+        Args:
+            file_hashes: Documentos en los que buscar
+            query_embeddings: Matriz (q, dim) de preguntas
+            k: Resultados por pregunta
+        
+        Returns:
+            Por cada pregunta, lista de (distancia, texto, id, file_hash, página), o
+            None si hay tan pocos chunks que la búsqueda exacta es mejor
+        """
+        doc_indexes = [
+            (file_hash, self._get_vector_index(file_hash, self._require_collection(file_hash)))
+            for file_hash in dict.fromkeys(file_hashes)
+        ]
+        sizes = [len(index) for _, index in doc_indexes]
+        if sum(sizes) < settings.IVF_MIN_VECTORS:
+            return None
+        
+        key = tuple(sorted(file_hash for file_hash, _ in doc_indexes))
+        with self._lock:
+            ivf = self._ivf_indexes.get(key)
+            if ivf is not None:
+                self._ivf_indexes.move_to_end(key)
+        
+        if ivf is None:
+            start = time.perf_counter()
+            ivf = IVFIndex(
+                np.concatenate([index.vectors for _, index in doc_indexes]),
+                nlist=settings.IVF_NLIST,
+                metric=settings.VECTOR_METRIC,
+                iterations=settings.IVF_KMEANS_ITERATIONS
+            )
+            print(f"Índice IVF construido: {len(ivf)} chunks, {ivf.nlist} grupos, "
+                  f"{time.perf_counter() - start:.2f}s")
+            with self._lock:
+                self._ivf_indexes[key] = ivf
+                while len(self._ivf_indexes) > settings.IVF_CACHE_SIZE:
+                    self._ivf_indexes.popitem(last=False)
+        
+        # Fila global -> (documento, fila dentro del documento)
+        doc_offsets = np.cumsum([0] + sizes)
+        indices, distances = ivf.search(query_embeddings, k, nprobe=settings.IVF_NPROBE)
+        
+        found = []
+        for row, row_distances in zip(indices, distances):
+            query_found = []
+            for i, distance in zip(row, row_distances):
+                if i < 0:
+                    continue
+                doc = int(np.searchsorted(doc_offsets, i, side="right")) - 1
+                file_hash, index = doc_indexes[doc]
+                local = i - doc_offsets[doc]
+                query_found.append(
+                    (float(distance), index.texts[local], index.ids[local], file_hash, index.pages[local])
+                )
+            found.append(query_found)
+        return found
+    
+    def _vector_index_path(self, file_hash: str) -> str:
+        return os.path.join(settings.VECTOR_STORE_PATH, "numpy_index", f"{self.collection_name(file_hash)}.npy")
+    
+    def _get_vector_index(self, file_hash: str, collection) -> NumpyVectorIndex:
+        """
+        Devuelve el índice NumPy de un documento: desde memoria, desde disco
+        (mapeado en memoria) o construido una vez a partir de ChromaDB
+        """
+        index = self._vector_indexes.get(file_hash)
+        if index is not None:
+            return index
+        
+        path = self._vector_index_path(file_hash)
+        index = NumpyVectorIndex.load(path)
+        if index is None or index.metric != settings.VECTOR_METRIC:
+            data = collection.get(include=["embeddings", "documents", "metadatas"])
+            index = NumpyVectorIndex(
+                np.asarray(data["embeddings"], dtype=np.float32).reshape(len(data["ids"]), -1),
+                data["ids"],
+                data["documents"],
+                metric=settings.VECTOR_METRIC,
+                pages=[(metadata or {}).get("page_number") for metadata in data["metadatas"]]
+            )
+            index.save(path)
+            print(f"Índice NumPy construido para '{collection.name}' ({len(index)} chunks)")
+        
+        with self._lock:
+            self._vector_indexes[file_hash] = index
+        return index
+    
+    def _lexical_index_path(self, file_hash: str) -> str:
+        return os.path.join(settings.VECTOR_STORE_PATH, "lexical_index", f"{self.collection_name(file_hash)}.npz")
+    
+    def _build_lexical_index(
+        self,
+        file_hash: str,
+        texts: List[str],
+        ids: List[str],
+        pages: List[Optional[int]]
+    ) -> BM25Index:
+        """
+        Construye, guarda y deja en memoria el índice BM25 de un documento
+        """
+        start = time.perf_counter()
+        index = BM25Index(texts, ids, pages, k1=settings.BM25_K1, b=settings.BM25_B)
+        index.save(self._lexical_index_path(file_hash))
+        with self._lock:
+            self._lexical_indexes[file_hash] = index
+        print(f"Índice BM25 construido: {len(index)} chunks, {len(index.vocabulary)} términos, "
+              f"{time.perf_counter() - start:.2f}s")
+        return index
+    
+    def _get_lexical_index(self, file_hash: str, collection) -> BM25Index:
+        """
+        Devuelve el índice BM25 de un documento: desde memoria, desde disco o
+        construido una vez a partir de ChromaDB (documentos indexados antes
+        de existir la búsqueda híbrida)
+        """
+        index = self._lexical_indexes.get(file_hash)
+        if index is not None:
+            return index
         
-        print(f"Recuperados {len(retrieval_result.chunks)} chunks para la pregunta")
+        index = BM25Index.load(self._lexical_index_path(file_hash))
+        if index is None:
+            data = collection.get(include=["documents", "metadatas"])
+            return self._build_lexical_index(
+                file_hash,
+                data["documents"],
+                data["ids"],
+                [(metadata or {}).get("page_number") for metadata in data["metadatas"]]
+            )
         
-        return retrieval_result
+        with self._lock:
+            self._lexical_indexes[file_hash] = index
+        return index
     
-    def get_collection_info(self) -> dict:
+    def get_collection_info(self, file_hash: str) -> dict:
         """
-        Obtiene información sobre la colección actual
+        Obtiene información sobre la colección de un documento
+        
+        Args:
+            file_hash: Hash del documento
         
         Returns:
             Diccionario con información de la colección
         """
-        if self.collection is None:
+        collection = self._get_stored_collection(file_hash)
+        if collection is None:
             return {"exists": False}
         
-        count = self.collection.count()
+        metadata = collection.metadata or {}
         return {
             "exists": True,
-            "name": settings.COLLECTION_NAME,
-            "total_chunks": count
+            "name": collection.name,
+            "file_name": metadata.get("file_name"),
+            "total_chunks": collection.count()
         }
+    
+    def list_documents(self) -> List[dict]:
+        """
+        Lista los documentos guardados en disco
+        
+        Returns:
+            Lista de diccionarios con nombre, hash, chunks, último uso, si
+            está completo y si es de la configuración actual (current)
+        """
+        documents = []
+        for item in self.client.list_collections():
+            # Según la versión de ChromaDB se devuelven nombres u objetos
+            name = item if isinstance(item, str) else item.name
+            if not name.startswith("doc_"):
+                continue
+            try:
+                collection = self.client.get_collection(name=name)
+            except Exception:
+                continue
+            metadata = collection.metadata or {}
+            documents.append({
+                "name": name,
+                "file_hash": metadata.get("file_hash"),
+                "file_name": metadata.get("file_name"),
+                "created_at": metadata.get("created_at", 0),
+                "last_used": metadata.get("last_used", 0),
+                "complete": bool(metadata.get("complete")),
+                "current": self._is_current(metadata),
+                "total_chunks": collection.count()
+            })
+        return documents
+    
+    def _delete_vector_index(self, file_hash: str) -> None:
+        """
+        Borra del disco los índices NumPy y BM25 de un documento, si existen
+        """
+        paths = (self._vector_index_path(file_hash), self._lexical_index_path(file_hash))
+        for file_path in [p for path in paths for p in (path, os.path.splitext(path)[0] + ".json")]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    
+    def _evict_old_documents(self, keep: Optional[str] = None) -> None:
+        """
+        Elimina los documentos menos usados recientemente cuando se superan
+        los límites de VECTOR_STORE_MAX_DOCUMENTS o VECTOR_STORE_MAX_CHUNKS
+        
+        Args:
+            keep: Nombre de una colección que nunca se debe eliminar
+        """
+        max_documents = settings.VECTOR_STORE_MAX_DOCUMENTS
+        max_chunks = settings.VECTOR_STORE_MAX_CHUNKS
+        
+        # Del menos usado al más usado. Las colecciones incompletas no cuentan ni
+        # se borran: otro hilo puede estar escribiéndolas
+        documents = sorted(
+            (doc for doc in self.list_documents() if doc["complete"]),
+            key=lambda d: d["last_used"]
+        )
+        total_documents = len(documents)
+        total_chunks = sum(d["total_chunks"] for d in documents)
+        
+        for doc in documents:
+            over_documents = max_documents > 0 and total_documents > max_documents
+            over_chunks = max_chunks > 0 and total_chunks > max_chunks
+            if not (over_documents or over_chunks):
+                break
+            if doc["name"] == keep:
+                continue
+            
+            self.client.delete_collection(doc["name"])
+            with self._lock:
+                self._collections.pop(doc["file_hash"], None)
+                self._vector_indexes.pop(doc["file_hash"], None)
+                self._lexical_indexes.pop(doc["file_hash"], None)
+                for key in [key for key in self._ivf_indexes if doc["file_hash"] in key]:
+                    del self._ivf_indexes[key]
+            self._delete_vector_index(doc["file_hash"])
+            total_documents -= 1
+            total_chunks -= doc["total_chunks"]
+            print(f"Documento '{doc['file_name']}' expulsado del almacén")
 
 
 ## Explicación rápida:
 
-##`create_collection()`**: Guarda todos los chunks del PDF en ChromaDB con sus embeddings
-##`retrieve_context()`**: Busca los chunks más parecidos a la pregunta del usuario
+##`create_collection()`**: Guarda todos los chunks del documento en su propia colección de ChromaDB
+##    (reutilizando los embeddings de la versión anterior del archivo si la hay)
+##`load_collection()`**: Reutiliza un documento ya guardado en disco (por su hash)
+##`retrieve_context()`**: Busca los chunks más parecidos a la pregunta en uno o varios documentos
+##    (por defecto, búsqueda híbrida: vectores + BM25 unidos con Reciprocal Rank Fusion)
+##`retrieve_context_batch()`**: Lo mismo para muchas preguntas a la vez
 ##`get_collection_info()`**: Da información sobre lo que está guardado
-
@@ -1,60 +1,202 @@
 import hashlib
-from typing import List
+import tempfile
+import time
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
 from models.document import Document, Chunk
+from models.chunk_store import ChunkStore, ChunkStoreBuilder
 from config.settings import settings
+from services.metrics_service import Stopwatch, metrics
 from services.extractor_service import ExtractorService 
+from services.chunking_service import Chunker, Span, chunk_stats, get_chunker
+
+# Bytes que se leen de cada vez al calcular el hash o copiar un archivo
+READ_BLOCK_SIZE = 1024 * 1024
 
 class DocumentService:
     """
     Servicio unificado para procesar cualquier documento
     """
-    def __init__(self):
+    def __init__(self, chunker: Optional[Chunker] = None):
         self.extractor = ExtractorService()
+        # Estrategia de troceado (settings.CHUNK_STRATEGY por defecto)
+        self.chunker = chunker or get_chunker()
 
     @staticmethod
     def hash_file(file) -> str:
-        # Crea una huella digital del archivo
-        return hashlib.sha256(file.getvalue()).hexdigest()
+        # Crea una huella digital del archivo (subida de Streamlit o archivo abierto en disco)
+        # sin copiarlo entero en memoria; al terminar el archivo queda al principio
+        digest = hashlib.sha256()
+        if hasattr(file, "getbuffer"):
+            # BytesIO (las subidas de Streamlit lo son): se lee su memoria directamente
+            with file.getbuffer() as view:
+                digest.update(view)
+        else:
+            file.seek(0)
+            for block in iter(lambda: file.read(READ_BLOCK_SIZE), b""):
+                digest.update(block)
+        file.seek(0)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def spool_file(stream, length: Optional[int] = None) -> Tuple[IO[bytes], str]:
+        # Copia un flujo que no se puede rebobinar (p. ej. el cuerpo de una petición
+        # HTTP) a un temporal en disco y calcula el hash en la misma pasada. Los
+        # extractores leen después el temporal, que se borra al cerrarlo.
+        # Devuelve (temporal abierto al principio, hash)
+        digest = hashlib.sha256()
+        spooled = tempfile.TemporaryFile()
+        remaining = length
+        try:
+            while remaining is None or remaining > 0:
+                block = stream.read(READ_BLOCK_SIZE if remaining is None else min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                spooled.write(block)
+                if remaining is not None:
+                    remaining -= len(block)
+        except BaseException:
+            spooled.close()
+            raise
+        spooled.seek(0)
+        return spooled, digest.hexdigest()
+
+    @staticmethod
+    def content_id(content: str, seen: Dict[str, int]) -> str:
+        # ID según el contenido: el mismo texto tiene el mismo ID en cualquier
+        # versión del documento. Si un texto se repite se numeran las repeticiones.
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        return digest if occurrence == 0 else f"{digest}-{occurrence}"
 
     def chunk_text(self, text: str) -> List[Chunk]:
         # Divide el texto en pedazos
-        chunk_size = settings.CHUNK_SIZE
-        overlap = settings.CHUNK_OVERLAP
-        chunks = []
-        start = 0
-        chunk_id = 0
-        
-        while start < len(text):
-            chunk_text = text[start:start + chunk_size]
-            chunk = Chunk(
-                id=f"chunk_{chunk_id}", 
-                content=chunk_text, 
-                start_index=start, 
-                size=len(chunk_text)
+        return list(self._make_chunks(text, self.chunker.split(text), {}))
+
+    def _make_chunks(self, text: str, spans: List[Span], seen: Dict[str, int], offset: int = 0,
+                     page_number: Optional[int] = None) -> Iterator[Chunk]:
+        # Convierte los spans de un texto en Chunks; offset es su posición dentro del documento completo
+        for start, end in spans:
+            content = text[start:end]
+            yield Chunk(
+                id=self.content_id(content, seen), 
+                content=content, 
+                start_index=offset + start, 
+                size=end - start,
+                page_number=page_number
             )
-            chunks.append(chunk)
-            chunk_id += 1
-            start += chunk_size - overlap
-        return chunks
 
-    def process_file(self, file, file_name: str) -> Document:
+    def chunk_pages(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Chunk]:
+        # Trocea las páginas según van llegando, sin unir todo el texto.
+        # Se agrupan CHUNK_BATCH_PAGES páginas para tokenizarlas en lote.
+        # Los chunks no cruzan páginas, así cada uno sabe de qué página viene.
+        seen = {}
+        offset = 0
+        batch = []
+        
+        def flush():
+            nonlocal offset
+            for (page_number, text), spans in zip(batch, self.chunker.split_many([text for _, text in batch])):
+                yield from self._make_chunks(text, spans, seen, offset, page_number)
+                offset += len(text) + 1  # +1 por el salto de línea entre páginas
+            batch.clear()
+        
+        for page in pages:
+            batch.append(page)
+            if len(batch) >= settings.CHUNK_BATCH_PAGES:
+                yield from flush()
+        if batch:
+            yield from flush()
+
+    @staticmethod
+    def get_chunk_stats(chunks) -> dict:
+        # Número de chunks y estadísticas de tamaño (caracteres); acepta un ChunkStore o una lista de Chunk
+        if isinstance(chunks, ChunkStore):
+            return chunk_stats(chunks.lengths)
+        return chunk_stats([chunk.size for chunk in chunks])
+
+    def chunk_row_groups(self, file) -> Iterator[Chunk]:
+        # Un chunk por grupo de filas de Excel (con la cabecera repetida), sin
+        # pasar por el troceado por caracteres que cortaría filas por la mitad
+        seen = {}
+        offset = 0
+        row_groups = self.extractor.iter_row_groups(
+            file,
+            max_chars=settings.SPREADSHEET_CHUNK_CHARS,
+            max_rows=settings.SPREADSHEET_MAX_ROWS_PER_CHUNK
+        )
+        for sheet_number, sheet_name, row_start, row_end, text in row_groups:
+            yield Chunk(
+                id=self.content_id(text, seen),
+                content=text,
+                start_index=offset,
+                size=len(text),
+                page_number=sheet_number,
+                sheet_name=sheet_name,
+                row_start=row_start,
+                row_end=row_end
+            )
+            offset += len(text) + 1
+
+    def process_file(self, file, file_name: str, file_hash: Optional[str] = None) -> Document:
+        # Mide el documento completo y cuenta sus chunks. Si quien llama ya
+        # calculó el hash (p. ej. para ver si estaba indexado) no se vuelve a leer el archivo
+        with metrics.span("process_file"):
+            document = self._process_file(file, file_name, file_hash)
+        metrics.increment("documents_processed_total")
+        metrics.increment("chunks_created_total", len(document.chunks))
+        metrics.observe("chunks_per_document", len(document.chunks))
+        return document
+    
+    def _process_file(self, file, file_name: str, file_hash: Optional[str] = None) -> Document:
         # Detectar extensión
         extension = file_name.split(".")[-1].lower()
-        file_hash = self.hash_file(file)
+        if file_hash is None:
+            # hash_file deja el puntero del archivo al principio
+            with metrics.span("process_file.hash"):
+                file_hash = self.hash_file(file)
         
-        # Resetear el puntero del archivo tras el hash
-        file.seek(0)
+        # Los chunks se guardan en formato compacto: el texto una vez y la
+        # posición de cada chunk (su contenido copiado se descarta enseguida)
+        builder = ChunkStoreBuilder()
+        
+        # Excel: grupos de filas leídos en streaming (cada hoja es una página)
+        if extension == "xlsx":
+            total_pages = 0
+            with metrics.span("process_file.extract"):
+                for chunk in self.chunk_row_groups(file):
+                    builder.add_text(chunk.content)
+                    builder.add(chunk)
+                    total_pages = max(total_pages, chunk.page_number)
+            return Document(
+                file_name=file_name,
+                file_hash=file_hash,
+                chunks=builder.build(),
+                total_pages=total_pages
+            )
+        
+        # 1 y 2. Extraer y trocear en streaming, una página cada vez
+        total_pages = 0
+        extraction = Stopwatch()
         
-        # 1. Extraer texto (usando el nuevo servicio)
-        full_text = self.extractor.extract_text(file, extension)
+        def counted_pages():
+            nonlocal total_pages
+            for page_number, text in extraction.wrap(self.extractor.iter_pages(file, extension)):
+                total_pages = page_number
+                yield page_number, text
         
-        # 2. Trocear texto
-        chunks = self.chunk_text(full_text)
+        # La extracción y el troceado van intercalados: se separan sus tiempos
+        start = time.perf_counter()
+        for chunk in self.chunk_pages(builder.pages(counted_pages())):
+            builder.add(chunk)
+        chunks = builder.build()
+        metrics.record_span("process_file.extract", extraction.elapsed)
+        metrics.record_span("process_file.chunk", time.perf_counter() - start - extraction.elapsed)
         
         return Document(
             file_name=file_name,
             file_hash=file_hash,
-            full_text=full_text,
             chunks=chunks,
-            total_pages=1 
-        )
\ No newline at end of file
+            total_pages=total_pages
+        )
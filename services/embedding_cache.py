@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Caché de embeddings direccionada por contenido
+    
+    La clave es el SHA-256 del nombre del modelo más el texto, así que el
+    mismo texto con otro modelo no colisiona. Tiene un nivel en memoria (LRU
+    acotado) y, opcionalmente, un nivel en disco (SQLite) que sobrevive a los
+    reinicios.
+    """
+    
+    def __init__(self, model_name: str, max_entries: int = 10000, path: Optional[str] = None):
+        """
+        Args:
+            model_name: Nombre del modelo de embeddings
+            max_entries: Máximo de vectores en memoria (0 = sin nivel en memoria)
+            path: Ruta del fichero SQLite (None = sin nivel en disco)
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+    
+    def make_key(self, text: str) -> str:
+        """
+        Calcula la clave de un texto para el modelo de esta caché
+        """
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Busca los embeddings de varios textos
+        
+        Args:
+            texts: Textos a buscar
+        
+        Returns:
+            Lista alineada con texts: el vector si estaba en caché, o None
+        """
+        keys = [self.make_key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+            
+            if missing and self._db is not None:
+                for key, vector in self._read_disk(list(missing.keys())).items():
+                    for i in missing.pop(key):
+                        results[i] = vector
+                        self.hits += 1
+                        self.disk_hits += 1
+                    self._remember(key, vector)
+            
+            self.misses += sum(len(positions) for positions in missing.values())
+        
+        return results
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """
+        Guarda los embeddings de varios textos
+        
+        Args:
+            texts: Textos
+            vectors: Matriz (len(texts), dim) con sus embeddings
+        """
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(text)
+                vector = np.array(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+            
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+                )
+                self._db.commit()
+    
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """
+        Añade un vector al nivel en memoria, expulsando el menos usado
+        """
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Lee del nivel en disco los vectores de las claves indicadas
+        """
+        found = {}
+        # SQLite limita el número de parámetros por consulta
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            cursor = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            )
+            for key, blob in cursor:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+    
+    def get_stats(self) -> dict:
+        """
+        Obtiene los contadores de la caché
+        
+        Returns:
+            Diccionario con aciertos, fallos, tasa de acierto y tamaño
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._db is not None
+        }
+    
+    def clear(self) -> None:
+        """
+        Vacía la caché (memoria y disco) y reinicia los contadores
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+            self.hits = self.disk_hits = self.misses = 0
@@ -1,8 +1,9 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 
 from config.settings import settings
+from services.embedding_cache import EmbeddingCache
+from services.metrics_service import metrics
 
 
 class EmbeddingService:
@@ -14,60 +15,217 @@ class EmbeddingService:
         """
         Inicializa el modelo de embeddings
         """
+        # sentence-transformers (y torch) se importan al crear el servicio, no al importar el módulo
+        from sentence_transformers import SentenceTransformer
+        
         self.model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
         print(f" Modelo de embeddings cargado: {settings.EMBEDDING_MODEL_NAME}")
+        
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        
+        # Caché de vectores: textos repetidos no se vuelven a calcular
+        self.cache = EmbeddingCache(
+            settings.EMBEDDING_MODEL_NAME,
+            max_entries=settings.EMBEDDING_CACHE_SIZE,
+            path=settings.EMBEDDING_CACHE_PATH or None
+        )
+    
+    def _encode_cached(self, texts: List[str]) -> np.ndarray:
+        """
+        Calcula los embeddings pasando por la caché: solo los textos que no
+        están guardados (y sin repetir) llegan al modelo
+        
+        Args:
+            texts: Textos a convertir
+            
+        Returns:
+            Matriz float32 (len(texts), dim)
+        """
+        cached = self.cache.get_many(texts)
+        
+        # Aciertos y fallos por posición, igual que los cuenta EmbeddingCache
+        missed_positions = sum(vector is None for vector in cached)
+        metrics.increment("embedding_cache_hits_total", len(texts) - missed_positions)
+        metrics.increment("embedding_cache_misses_total", missed_positions)
+        
+        # Textos únicos que faltan, en orden de aparición
+        missing = list(dict.fromkeys(
+            text for text, vector in zip(texts, cached) if vector is None
+        ))
+        computed = {}
+        if missing:
+            vectors = self.model.encode(
+                missing,
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                convert_to_numpy=True
+            ).astype(np.float32, copy=False)
+            self.cache.put_many(missing, vectors)
+            computed = dict(zip(missing, vectors))
+            
+            # Sin aciertos: la matriz del modelo ya es el resultado
+            if len(missing) == len(texts):
+                return np.ascontiguousarray(vectors)
+        
+        # Rellenar una única matriz contigua, fila a fila
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, (text, vector) in enumerate(zip(texts, cached)):
+            result[i] = vector if vector is not None else computed[text]
+        return result
+    
+    def encode_query(self, text: str) -> np.ndarray:
+        """
+        Convierte un texto en un vector float32
+        
+        Args:
+            text: Texto a convertir
+            
+        Returns:
+            Vector float32 de forma (dim,)
+        """
+        return self._encode_cached([text])[0]
+    
+    def encode_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Convierte múltiples textos en una matriz float32 contigua
+        
+        Args:
+            texts: Lista de textos a convertir
+            
+        Returns:
+            Matriz float32 de forma (len(texts), dim)
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self._encode_cached(texts)
     
     def encode_text(self, text: str) -> List[float]:
         """
         Convierte un texto en un vector (embedding)
         
+        Compatibilidad: el código nuevo debe usar encode_query.
+        
         Args:
             text: Texto a convertir
             
         Returns:
             Lista de números (vector)
         """
-        embedding = self.model.encode([text])
-        return embedding[0].tolist()
+        return self.encode_query(text).tolist()
     
     def encode_batch(self, texts: List[str]) -> List[List[float]]:
         """
         Convierte múltiples textos en vectores (más eficiente)
         
+        Compatibilidad: el código nuevo debe usar encode_array.
+        
         Args:
             texts: Lista de textos a convertir
             
         Returns:
             Lista de vectores
         """
-        embeddings = self.model.encode(texts)
-        return embeddings.tolist()
+        return self.encode_array(texts).tolist()
+    
+    def iter_encode_batches(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        known: Optional[Callable[[List[int]], Dict[int, np.ndarray]]] = None
+    ) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """
+        Convierte textos en vectores por micro-lotes, entregando cada lote en
+        cuanto está listo (la memoria no depende del tamaño del documento)
+        
+        Los textos se ordenan por longitud para que cada lote tenga tamaños
+        parecidos y el modelo rellene (padding) lo mínimo.
+        
+        Args:
+            texts: Textos a convertir
+            batch_size: Textos por lote (usa settings.EMBEDDING_BATCH_SIZE por defecto)
+            known: Función opcional que recibe las posiciones de un lote y
+                devuelve {posición: vector} de los que ya se conocen (p. ej.
+                de una versión anterior del documento); esos no se calculan
+            
+        Returns:
+            Iterador de (posiciones en texts, matriz float32 de esas posiciones)
+        """
+        if batch_size is None:
+            batch_size = settings.EMBEDDING_BATCH_SIZE
+        
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            found = known(positions) if known is not None else {}
+            if not found:
+                yield positions, self._encode_cached([texts[i] for i in positions])
+                continue
+            
+            embeddings = np.empty((len(positions), self.dimension), dtype=np.float32)
+            missing = [row for row, i in enumerate(positions) if i not in found]
+            if missing:
+                embeddings[missing] = self._encode_cached([texts[positions[row]] for row in missing])
+            for row, i in enumerate(positions):
+                if i in found:
+                    embeddings[row] = found[i]
+            yield positions, embeddings
     
-    def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+    def get_cache_stats(self) -> dict:
+        """
+        Obtiene los aciertos y fallos de la caché de embeddings
+        
+        Returns:
+            Diccionario con los contadores de la caché
+        """
+        return self.cache.get_stats()
+    
+    def calculate_similarity(self, embedding1, embedding2) -> float:
         """
         Calcula la similitud entre dos embeddings (cosine similarity)
         
         Args:
-            embedding1: Primer vector
-            embedding2: Segundo vector
+            embedding1: Primer vector (array float32 o lista)
+            embedding2: Segundo vector (array float32 o lista)
             
         Returns:
             Score de similitud (0 a 1, más alto = más similar)
         """
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
+        # np.asarray no copia si ya son arrays float32
+        vec1 = np.asarray(embedding1, dtype=np.float32)
+        vec2 = np.asarray(embedding2, dtype=np.float32)
         
         # Similitud coseno
         similarity = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
         return float(similarity)
+    
+    def calculate_similarities(self, query_embedding, embeddings) -> np.ndarray:
+        """
+        Calcula de una vez la similitud coseno entre una consulta y muchos vectores
+        
+        Args:
+            query_embedding: Vector (dim,) de la consulta
+            embeddings: Matriz (n, dim) de vectores
+            
+        Returns:
+            Array float32 (n,) con la similitud de cada vector
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        norms[norms == 0] = 1.0
+        return (matrix @ query) / norms
 
 
 ##  Explicación rápida:
 
 ##- **`__init__()`**: Carga el modelo de embeddings al iniciar
-##- **`encode_text()`**: Convierte 1 texto en vector
+##- **`encode_query()` / `encode_array()`**: Devuelven arrays float32 (lo que usa el resto de servicios)
+##- **`encode_text()`**: Convierte 1 texto en vector (lista, por compatibilidad)
 ##- **`encode_batch()`**: Convierte muchos textos de una vez (más rápido)
+##- **`iter_encode_batches()`**: Igual, pero por lotes pequeños para documentos enormes
+##- **`_encode_cached()`**: Reutiliza los vectores ya calculados (caché por contenido)
 ##- **`calculate_similarity()`**: Calcula qué tan parecidos son dos textos
+##- **`calculate_similarities()`**: Lo mismo contra muchos vectores a la vez (vectorizado)
 
 
 ##¿Por qué necesitamos embeddings?
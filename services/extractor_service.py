@@ -1,33 +1,115 @@
-import pandas as pd
-from docx import Document as DocxReader
-from pypdf import PdfReader
 import io
+from typing import Iterator, Tuple
 
 class ExtractorService:
     """
     Clase especializada en extraer texto de diferentes formatos.
+    
+    La librería de cada formato (pypdf, python-docx, openpyxl) se importa la
+    primera vez que se lee un archivo de ese formato.
     """
     @staticmethod
     def extract_text(file, extension: str) -> str:
+        # Todo el texto de una vez (los documentos grandes deben usar iter_pages)
+        return "\n".join(text for _, text in ExtractorService.iter_pages(file, extension) if text)
+    
+    @staticmethod
+    def iter_pages(file, extension: str) -> Iterator[Tuple[int, str]]:
+        """
+        Genera (número de página, texto) una vez por página, sin guardar el
+        documento entero en memoria. Los formatos sin páginas (DOCX, TXT)
+        son una sola página; en Excel cada hoja cuenta como una página.
+        """
         if extension == "pdf":
+            from pypdf import PdfReader
+            
             reader = PdfReader(file)
-            return "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
+            for page_number, page in enumerate(reader.pages, start=1):
+                # Cada página se extrae una sola vez
+                yield page_number, page.extract_text() or ""
         
         elif extension == "docx":
+            from docx import Document as DocxReader
+            
             doc = DocxReader(file)
-            return "\n".join([para.text for para in doc.paragraphs])
+            yield 1, "\n".join([para.text for para in doc.paragraphs])
         
         elif extension == "xlsx":
-            # Convertimos el Excel a un formato de texto legible (CSV tabulado)
-            df_dict = pd.read_excel(file, sheet_name=None)
-            full_text = ""
-            for sheet_name, df in df_dict.items():
-                full_text += f"\n--- Hoja: {sheet_name} ---\n"
-                full_text += df.to_csv(index=False, sep="\t")
-            return full_text
+            # Convertimos el Excel a un formato de texto legible (CSV tabulado), una hoja por página
+            from openpyxl import load_workbook
+            
+            workbook = load_workbook(file, read_only=True, data_only=True)
+            try:
+                for page_number, sheet in enumerate(workbook.worksheets, start=1):
+                    lines = [f"--- Hoja: {sheet.title} ---"]
+                    lines.extend(ExtractorService._row_text(row) for row in sheet.iter_rows(values_only=True))
+                    yield page_number, "\n".join(line for line in lines if line)
+            finally:
+                workbook.close()
         
         elif extension == "txt":
             # Leemos el contenido del archivo de texto
-            return file.getvalue().decode("utf-8")
+            yield 1, file.read().decode("utf-8")
+    
+    @staticmethod
+    def _row_text(row) -> str:
+        # Una fila de Excel como texto separado por tabuladores (las celdas vacías al final se quitan)
+        return "\t".join("" if value is None else str(value) for value in row).rstrip("\t")
+    
+    @staticmethod
+    def iter_row_groups(
+        file,
+        max_chars: int = 1000,
+        max_rows: int = 50
+    ) -> Iterator[Tuple[int, str, int, int, str]]:
+        """
+        Lee un Excel fila a fila (openpyxl en modo solo lectura) y genera
+        grupos de filas con la cabecera repetida al principio de cada uno.
+        En memoria solo está el grupo actual, no la hoja entera.
+        
+        Cada grupo se cierra al llegar a max_rows filas o cuando la siguiente
+        fila haría pasar el texto de max_chars (siempre con al menos una fila).
+        
+        Returns:
+            Iterador de (nº de hoja, nombre de hoja, primera fila, última fila, texto).
+            Las filas se cuentan desde la primera fila con datos de la hoja.
+        """
+        from openpyxl import load_workbook
         
-        return ""
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            for sheet_number, sheet in enumerate(workbook.worksheets, start=1):
+                header = None
+                group = []
+                group_chars = 0
+                first_row = None
+                
+                for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                    line = ExtractorService._row_text(row)
+                    if not line:
+                        continue
+                    if header is None:
+                        header = line
+                        header_row = row_number
+                        title = f"--- Hoja: {sheet.title} ---"
+                        base_chars = len(title) + len(header) + 2
+                        continue
+                    
+                    if group and (len(group) >= max_rows or base_chars + group_chars + len(line) + 1 > max_chars):
+                        yield sheet_number, sheet.title, first_row, last_row, "\n".join([title, header] + group)
+                        group = []
+                        group_chars = 0
+                    
+                    if not group:
+                        first_row = row_number
+                    group.append(line)
+                    group_chars += len(line) + 1
+                    last_row = row_number
+                
+                if group:
+                    yield sheet_number, sheet.title, first_row, last_row, "\n".join([title, header] + group)
+                elif header is not None:
+                    # Hoja con solo cabecera
+                    yield sheet_number, sheet.title, header_row, header_row, "\n".join([title, header])
+        finally:
+            workbook.close()
@@ -0,0 +1,143 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, List, Optional
+
+from models.document import Document, IngestResult
+from services.document_service import DocumentService
+from services.database_service import DatabaseService
+
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "xlsx", "txt")
+
+
+def extract_and_chunk(path: str, file_name: str, file_hash: Optional[str] = None) -> Document:
+    """
+    Extrae y trocea un archivo del disco
+    
+    Se ejecuta dentro de los procesos del pool (pypdf es CPU y no suelta el
+    GIL), por eso es una función de módulo y crea su propio DocumentService.
+    
+    Args:
+        path: Ruta del archivo
+        file_name: Nombre con el que se guardará el documento
+        file_hash: Hash ya calculado (así el archivo no se vuelve a leer para el hash)
+    
+    Returns:
+        Documento con sus chunks (todavía sin embeddings)
+    """
+    with open(path, "rb") as file:
+        return DocumentService().process_file(file, file_name, file_hash)
+
+
+class IngestService:
+    """
+    Servicio para indexar muchos archivos a la vez
+    
+    La extracción y el troceado se reparten en un pool de procesos; los
+    embeddings se generan en el proceso principal, que es el único que tiene
+    el modelo cargado. Un archivo que falla no detiene al resto.
+    
+    Como mucho hay 2 archivos por proceso en curso: el siguiente se envía
+    cuando se indexa uno, así los documentos extraídos no se acumulan en
+    memoria aunque el lote sea muy grande.
+    """
+    
+    def __init__(self, document_service: DocumentService, database_service: DatabaseService):
+        self.document_service = document_service
+        self.database_service = database_service
+    
+    def ingest_files(
+        self,
+        paths: List[str],
+        workers: Optional[int] = None,
+        progress_callback: Optional[Callable[[IngestResult], None]] = None
+    ) -> List[IngestResult]:
+        """
+        Indexa una lista de archivos del disco
+        
+        Args:
+            paths: Rutas de los archivos
+            workers: Procesos para extraer y trocear (None = nº de CPUs)
+            progress_callback: Función opcional que recibe cada IngestResult
+                en cuanto ese archivo termina
+        
+        Returns:
+            Un IngestResult por archivo, en el orden de paths
+        """
+        results = {}
+        
+        def finish(path: str, result: IngestResult):
+            results[path] = result
+            if progress_callback is not None:
+                progress_callback(result)
+        
+        # Descartar antes de repartir: formatos no soportados y documentos ya indexados
+        pending = []
+        for path in paths:
+            file_name = os.path.basename(path)
+            extension = file_name.rsplit(".", 1)[-1].lower()
+            if extension not in SUPPORTED_EXTENSIONS:
+                finish(path, IngestResult(file_name, "error", error=f"Formato no soportado: .{extension}"))
+                continue
+            try:
+                with open(path, "rb") as file:
+                    file_hash = self.document_service.hash_file(file)
+            except OSError as e:
+                finish(path, IngestResult(file_name, "error", error=str(e)))
+                continue
+            if self.database_service.load_collection(file_hash):
+                finish(path, IngestResult(file_name, "ya indexado", file_hash=file_hash))
+                continue
+            pending.append((path, file_hash))
+        
+        if pending:
+            workers = workers or os.cpu_count() or 1
+            max_in_flight = 2 * workers
+            queue = iter(pending)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {}
+                
+                def submit_next() -> None:
+                    item = next(queue, None)
+                    if item is not None:
+                        path, file_hash = item
+                        future = pool.submit(extract_and_chunk, path, os.path.basename(path), file_hash)
+                        futures[future] = (path, time.perf_counter())
+                
+                for _ in range(max_in_flight):
+                    submit_next()
+                # Los embeddings se generan aquí, de uno en uno, según van llegando los documentos
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, start = futures.pop(future)
+                        finish(path, self._index_document(future, os.path.basename(path), start))
+                        submit_next()
+        
+        return [results[path] for path in paths]
+    
+    def _index_document(self, future, file_name: str, start: float) -> IngestResult:
+        """
+        Recoge el documento de un proceso del pool y guarda sus embeddings
+        """
+        try:
+            document = future.result()
+            index_stats = self.database_service.create_collection(document)
+        except Exception as e:
+            print(f"Error indexando {file_name}: {e}")
+            return IngestResult(file_name, "error", error=f"{type(e).__name__}: {e}",
+                                seconds=time.perf_counter() - start)
+        
+        # Otro archivo del lote (o de otra sesión) con el mismo contenido se indexó antes
+        if index_stats["already_indexed"]:
+            return IngestResult(file_name, "ya indexado", file_hash=document.file_hash,
+                                seconds=time.perf_counter() - start)
+        
+        return IngestResult(
+            file_name,
+            "indexado",
+            file_hash=document.file_hash,
+            chunks=len(document.chunks),
+            reused=index_stats["reused"],
+            seconds=time.perf_counter() - start
+        )
@@ -1,15 +1,34 @@
-from .document_service import DocumentService # <--- Cambio importante aquí
-from .extractor_service import ExtractorService # <--- Agregamos esto
-from .embedding_service import EmbeddingService
-from .database_service import DatabaseService
-from .ai_service import AIService
-from .conversation_service import ConversationService
-
-__all__ = [
-    'DocumentService',
-    'ExtractorService',
-    'EmbeddingService',
-    'DatabaseService',
-    'AIService',
-    'ConversationService'
-]
\ No newline at end of file
+import importlib
+
+# Nombre exportado -> módulo que lo define. Se importan la primera vez que se
+# piden (PEP 562), así importar este módulo no carga torch, ChromaDB ni Gemini
+_EXPORTS = {
+    'DocumentService': 'document_service', # <--- Cambio importante aquí
+    'ExtractorService': 'extractor_service', # <--- Agregamos esto
+    'EmbeddingService': 'embedding_service',
+    'DatabaseService': 'database_service',
+    'RerankService': 'rerank_service',
+    'AIService': 'ai_service',
+    'ConversationService': 'conversation_service',
+    'IngestService': 'ingest_service',
+    'AnswerCache': 'answer_cache',
+    'RagPipeline': 'rag_pipeline',
+    'QAService': 'qa_service',
+    'ServiceRegistry': 'service_registry',
+    'registry': 'service_registry'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __package__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(__all__)
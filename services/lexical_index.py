@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Palabras, e identificadores compuestos (PX-1234-5, v2.3, 12/05/2024) completos
+WORD = re.compile(r"\w+")
+COMPOUND = re.compile(r"\w+(?:[-./]\w+)+")
+COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide un texto en términos para BM25
+    
+    Pasa a minúsculas y quita los acentos ("Página" = "pagina"). Un
+    identificador compuesto cuenta como término completo y también por
+    partes, así "PX-1234" encuentra tanto "PX-1234" como "1234".
+    """
+    text = text.lower()
+    if not text.isascii():
+        text = COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text))
+    return WORD.findall(text) + COMPOUND.findall(text)
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 de los chunks de un documento
+    
+    Las listas de apariciones (postings) se guardan en formato CSR: para el
+    término t, sus chunks son doc_ids[offsets[t]:offsets[t + 1]] y su peso
+    BM25 ya calculado está en weights en las mismas posiciones. Puntuar una
+    consulta es sumar unos pocos slices de arrays, sin bucles por chunk.
+    """
+    
+    def __init__(
+        self,
+        texts: List[str],
+        ids: List[str],
+        pages: Optional[List[Optional[int]]] = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        """
+        Args:
+            texts: Contenido de cada chunk
+            ids: ID de cada chunk
+            pages: Página de cada chunk (opcional)
+            k1: Saturación de la frecuencia del término
+            b: Peso de la normalización por longitud
+        """
+        if len(texts) != len(ids):
+            raise ValueError("texts e ids deben tener la misma longitud")
+        
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.pages = list(pages) if pages is not None else [None] * len(self.ids)
+        
+        vocabulary = {}
+        term_ids, doc_ids, counts = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths[doc] = len(terms)
+            frequencies = Counter(terms)
+            term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in frequencies)
+            doc_ids.extend([doc] * len(frequencies))
+            counts.extend(frequencies.values())
+        
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        counts = np.asarray(counts, dtype=np.float32)
+        
+        # Ordenar las apariciones por término para formar las listas CSR
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, counts = term_ids[order], doc_ids[order], counts[order]
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+        
+        n_docs = max(len(texts), 1)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        norms = k1 * (1.0 - b + b * lengths / average_length)
+        weights = idf[term_ids] * counts * (k1 + 1.0) / (counts + norms[doc_ids])
+        
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights.astype(np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los k chunks con mayor puntuación BM25
+        
+        Args:
+            query: Texto de la consulta
+            k: Número de resultados
+        
+        Returns:
+            (índices, puntuaciones), de mayor a menor puntuación; solo chunks
+            que contienen algún término de la consulta
+        """
+        if k <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Cada chunk aparece una sola vez por término: la suma indexada es segura
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = np.argsort(-scores[matched], kind="stable")
+        return matched[order], scores[matched[order]]
+    
+    def save(self, path: str) -> None:
+        """
+        Guarda el índice: los arrays en `path` (.npz) y el vocabulario, ids,
+        textos y páginas en un .json al lado
+        
+        Args:
+            path: Ruta del fichero .npz
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(self._meta_path(path), "w", encoding="utf-8") as f:
+            json.dump({"terms": terms, "ids": self.ids, "texts": self.texts, "pages": self.pages}, f)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """
+        Carga un índice guardado con save()
+        
+        Returns:
+            El índice, o None si no existe
+        """
+        meta_path = cls._meta_path(path)
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = np.load(path)
+        
+        index = cls.__new__(cls)
+        index.ids = meta["ids"]
+        index.texts = meta["texts"]
+        index.pages = meta.get("pages") or [None] * len(index.ids)
+        index.vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        index.offsets = arrays["offsets"]
+        index.doc_ids = arrays["doc_ids"]
+        index.weights = arrays["weights"]
+        return index
+    
+    @staticmethod
+    def _meta_path(path: str) -> str:
+        return os.path.splitext(path)[0] + ".json"
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Une varias listas ordenadas con Reciprocal Rank Fusion
+    
+    Cada elemento suma 1 / (k + posición) por cada lista en la que aparece;
+    no hace falta que las puntuaciones de las listas sean comparables.
+    
+    Args:
+        rankings: Listas de claves, de mejor a peor
+        k: Constante de suavizado (60 es el valor habitual)
+    
+    Returns:
+        (clave, puntuación) de mayor a menor puntuación
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
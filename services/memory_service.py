@@ -0,0 +1,186 @@
+import threading
+from typing import Callable, List, Optional
+
+from models.document import ConversationMessage
+from config.settings import settings
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación rápida de tokens (≈ 4 caracteres por token en Gemini)
+    
+    Contar los tokens exactos exige una llamada a la API; para decidir qué
+    cabe en el prompt basta con una aproximación.
+    """
+    return (len(text) + 3) // 4
+
+
+def format_messages(messages: List[ConversationMessage]) -> str:
+    """
+    Formatea mensajes como "rol: contenido", uno por línea
+    """
+    return "".join(f"{msg.role}: {msg.content}\n" for msg in messages)
+
+
+class ConversationMemory:
+    """
+    Memoria acotada de una conversación para el prompt
+    
+    Los últimos MEMORY_RECENT_TURNS turnos van literales; los anteriores se
+    resumen en un texto que se guarda y se actualiza en un hilo aparte, así
+    ninguna pregunta espera al resumen. Todo el historial del prompt cabe en
+    MEMORY_TOKEN_BUDGET tokens: si no cabe, se descartan primero los mensajes
+    más antiguos.
+    """
+    
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str], str]] = None,
+        token_budget: Optional[int] = None,
+        recent_turns: Optional[int] = None
+    ):
+        """
+        Args:
+            summarize: Función que recibe un prompt y devuelve el resumen
+                (p. ej. AIService.generate_simple_response). Sin ella los
+                mensajes antiguos simplemente se descartan.
+            token_budget: Tokens máximos del historial en el prompt
+            recent_turns: Turnos (pregunta + respuesta) que van literales
+        """
+        self.summarize = summarize
+        self.token_budget = token_budget or settings.MEMORY_TOKEN_BUDGET
+        self.recent_turns = recent_turns or settings.MEMORY_RECENT_TURNS
+        
+        self.summary = ""
+        self.summarized_count = 0  # Mensajes del principio ya incluidos en el resumen
+        self.turn_stats: List[dict] = []
+        
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._generation = 0  # Cambia al limpiar, para descartar resúmenes en curso
+    
+    def format_history(self, history: List[ConversationMessage]) -> str:
+        """
+        Construye el historial para el prompt sin pasar del presupuesto
+        
+        Args:
+            history: Historial completo de la conversación
+        
+        Returns:
+            Resumen de lo antiguo (si lo hay) más los mensajes recientes
+        """
+        with self._lock:
+            summary = self.summary
+            summarized_count = min(self.summarized_count, len(history))
+        
+        recent_start = max(0, len(history) - 2 * self.recent_turns)
+        if recent_start > summarized_count:
+            self._refresh_summary(history[:recent_start])
+        
+        budget = self.token_budget
+        summary_text = f"Resumen de la conversación anterior: {summary}\n" if summary else ""
+        budget -= estimate_tokens(summary_text)
+        
+        # Del más reciente al más antiguo: los turnos recientes y, mientras el
+        # resumen no los cubra, los antiguos, hasta agotar el presupuesto
+        lines = []
+        for msg in reversed(history[summarized_count:]):
+            line = f"{msg.role}: {msg.content}\n"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        lines.reverse()
+        
+        formatted = summary_text + "".join(lines)
+        self.turn_stats.append({
+            "messages": len(history),
+            "verbatim_messages": len(lines),
+            "summarized_messages": summarized_count,
+            "dropped_messages": len(history) - summarized_count - len(lines),
+            "summary_tokens": estimate_tokens(summary_text),
+            "history_tokens": estimate_tokens(formatted),
+            "prompt_tokens": 0
+        })
+        return formatted or "No hay historial previo."
+    
+    def record_prompt(self, prompt: str) -> None:
+        """
+        Anota el tamaño del prompt completo en las estadísticas del último turno
+        """
+        if self.turn_stats:
+            self.turn_stats[-1]["prompt_tokens"] = estimate_tokens(prompt)
+    
+    def _refresh_summary(self, old_messages: List[ConversationMessage]) -> None:
+        """
+        Lanza (si no hay otro en curso) un hilo que añade al resumen los
+        mensajes antiguos que todavía no cubre
+        """
+        if self.summarize is None:
+            return
+        
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            generation = self._generation
+            previous_summary = self.summary
+            new_messages = list(old_messages[self.summarized_count:])
+            target_count = len(old_messages)
+        
+        def run():
+            try:
+                summary = self.summarize(self._summary_prompt(previous_summary, new_messages))
+            except Exception as e:
+                print(f"Error resumiendo la conversación: {e}")
+                summary = None
+            with self._lock:
+                self._refreshing = False
+                if summary and generation == self._generation:
+                    # Un resumen demasiado largo se recorta para que no se coma el presupuesto
+                    self.summary = summary.strip()[:settings.MEMORY_SUMMARY_MAX_TOKENS * 4]
+                    self.summarized_count = target_count
+        
+        threading.Thread(target=run, name="conversation-summary", daemon=True).start()
+    
+    def _summary_prompt(self, previous_summary: str, messages: List[ConversationMessage]) -> str:
+        max_words = settings.MEMORY_SUMMARY_MAX_TOKENS * 3 // 4
+        return f"""
+Resume la siguiente conversación entre un usuario y un asistente sobre unos documentos.
+Conserva los datos concretos (nombres, cifras, decisiones) y lo que el usuario quiere saber.
+Máximo {max_words} palabras.
+
+RESUMEN ANTERIOR:
+{previous_summary or "(ninguno)"}
+
+MENSAJES NUEVOS:
+{format_messages(messages)}
+"""
+    
+    def clear(self) -> None:
+        """
+        Olvida el resumen y las estadísticas (el resumen en curso se descarta)
+        """
+        with self._lock:
+            self.summary = ""
+            self.summarized_count = 0
+            self._generation += 1
+        self.turn_stats = []
+    
+    def get_stats(self) -> dict:
+        """
+        Estadísticas del último turno más las medias de la conversación
+        
+        Returns:
+            Diccionario con last (dict del último turno o None), turns,
+            mean_prompt_tokens, max_prompt_tokens y summary_tokens
+        """
+        prompt_sizes = [turn["prompt_tokens"] for turn in self.turn_stats]
+        return {
+            "last": self.turn_stats[-1] if self.turn_stats else None,
+            "turns": len(self.turn_stats),
+            "mean_prompt_tokens": sum(prompt_sizes) / len(prompt_sizes) if prompt_sizes else 0.0,
+            "max_prompt_tokens": max(prompt_sizes, default=0),
+            "summary_tokens": estimate_tokens(self.summary)
+        }
@@ -0,0 +1,270 @@
+import contextvars
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+
+# Duración de cada etapa del camino RAG: una sola métrica con la etapa como etiqueta
+STAGE_METRIC = "rag_stage_seconds"
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Traza de la operación en curso (una pregunta o un documento), si se está grabando
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def _format_labels(labels: dict, extra: Optional[dict] = None) -> str:
+    """
+    Etiquetas en formato Prometheus: {nombre="valor",...}
+    """
+    labels = {**labels, **(extra or {})}
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    """
+    Valor en formato Prometheus sin perder precisión (enteros exactos, p. ej. 1234567)
+    """
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+class Stopwatch:
+    """
+    Acumula el tiempo de varios tramos de una misma etapa
+    
+    Sirve para etapas intercaladas (p. ej. extraer páginas mientras se
+    trocean): se mide cada tramo y al final se registra una sola muestra.
+    """
+    
+    def __init__(self):
+        self.elapsed = 0.0
+        self._start = 0.0
+    
+    def __enter__(self) -> "Stopwatch":
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.elapsed += time.perf_counter() - self._start
+    
+    def wrap(self, iterable: Iterable) -> Iterator:
+        """
+        Recorre un iterable acumulando solo el tiempo que se pasa dentro de él
+        """
+        iterator = iter(iterable)
+        while True:
+            with self:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+class Trace:
+    """
+    Tiempos de las etapas de una operación concreta (p. ej. la última pregunta)
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Tuple[str, float]] = []
+        self.values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def add_span(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((stage, seconds))
+    
+    def set_value(self, name: str, value: float) -> None:
+        with self._lock:
+            self.values[name] = value
+    
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "spans": [{"stage": stage, "ms": seconds * 1000} for stage, seconds in self.spans],
+                "values": dict(self.values)
+            }
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso: contadores y tiempos por etapa
+    
+    Los tiempos guardan sus últimas METRICS_MAX_SAMPLES muestras para
+    calcular p50/p95/p99 (ventana deslizante), además del número y la suma
+    totales. Se exportan en formato texto de Prometheus o en JSON.
+    
+    Las métricas viven en el proceso que las graba: lo que ocurre en los
+    procesos del pool de ingesta no aparece aquí.
+    """
+    
+    def __init__(self, max_samples: Optional[int] = None):
+        self.max_samples = max_samples or settings.METRICS_MAX_SAMPLES
+        self._counters: Dict[tuple, float] = {}
+        self._samples: Dict[tuple, deque] = {}
+        self._counts: Dict[tuple, int] = {}
+        self._sums: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name,) + tuple(sorted(labels.items()))
+    
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        """
+        Suma `value` a un contador
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+    
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Registra una muestra de una distribución (tiempos, tamaños de prompt...)
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.max_samples)
+            samples.append(value)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+        
+        trace = _current_trace.get()
+        if trace is not None and name != STAGE_METRIC:
+            trace.set_value(name, value)
+    
+    def record_span(self, stage: str, seconds: float) -> None:
+        """
+        Registra la duración de una etapa (y la añade a la traza en curso)
+        """
+        self.observe(STAGE_METRIC, seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, seconds)
+    
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """
+        Mide lo que tarda el bloque `with` como la etapa `stage`
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(stage, time.perf_counter() - start)
+    
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Trace]:
+        """
+        Graba las etapas que ocurren dentro del bloque en un Trace
+        
+        La traza se propaga a las tareas de asyncio y a las funciones que
+        RagPipeline ejecuta en su pool de hilos.
+        """
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+    
+    def snapshot(self) -> dict:
+        """
+        Estado actual de todas las métricas
+        
+        Returns:
+            {"counters": [...], "distributions": [...]} con nombre, etiquetas,
+            y para las distribuciones count, sum y p50/p95/p99
+        """
+        with self._lock:
+            counters = [
+                {"name": key[0], "labels": dict(key[1:]), "value": value}
+                for key, value in sorted(self._counters.items())
+            ]
+            samples = {key: np.asarray(values, dtype=np.float64) for key, values in self._samples.items()}
+            counts = dict(self._counts)
+            sums = dict(self._sums)
+        
+        distributions = []
+        for key in sorted(samples):
+            values = samples[key]
+            row = {"name": key[0], "labels": dict(key[1:]), "count": counts[key], "sum": sums[key]}
+            for quantile, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                row[f"p{int(quantile * 100)}"] = float(value)
+            distributions.append(row)
+        return {"counters": counters, "distributions": distributions}
+    
+    def export_json(self) -> str:
+        """
+        Métricas en JSON (ver snapshot)
+        """
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+    
+    def export_prometheus(self) -> str:
+        """
+        Métricas en el formato de texto de Prometheus
+        
+        Los contadores son `counter` y las distribuciones `summary` con los
+        cuantiles 0.5, 0.95 y 0.99.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+        
+        for counter in snapshot["counters"]:
+            if counter["name"] not in declared:
+                lines.append(f"# TYPE {counter['name']} counter")
+                declared.add(counter["name"])
+            lines.append(f"{counter['name']}{_format_labels(counter['labels'])} {_format_value(counter['value'])}")
+        
+        for row in snapshot["distributions"]:
+            name = row["name"]
+            if name not in declared:
+                lines.append(f"# TYPE {name} summary")
+                declared.add(name)
+            for quantile in QUANTILES:
+                value = row[f"p{int(quantile * 100)}"]
+                lines.append(f"{name}{_format_labels(row['labels'], {'quantile': quantile})} {_format_value(value)}")
+            lines.append(f"{name}_sum{_format_labels(row['labels'])} {_format_value(row['sum'])}")
+            lines.append(f"{name}_count{_format_labels(row['labels'])} {row['count']}")
+        
+        return "\n".join(lines) + "\n"
+    
+    def reset(self) -> None:
+        """
+        Borra todas las métricas
+        """
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+            self._counts.clear()
+            self._sums.clear()
+
+
+# Instancia global de métricas (una por proceso)
+metrics = MetricsRegistry()
@@ -0,0 +1,228 @@
+import asyncio
+import time
+from typing import Iterable, List, Optional, Sequence
+
+from models.document import IngestResult, RagAnswer
+from services.document_service import DocumentService
+from services.database_service import DatabaseService
+from services.rag_pipeline import RagPipeline
+
+
+class QAService:
+    """
+    Núcleo de preguntas y respuestas sin interfaz
+    
+    Reúne lo que hace ChatApp (indexar un archivo, elegir documentos,
+    preguntar) sin depender de Streamlit ni de st.session_state, para
+    usarlo desde la línea de comandos (ask.py), el servidor HTTP
+    (server.py) o pruebas de carga.
+    """
+    
+    def __init__(
+        self,
+        document_service: DocumentService,
+        database_service: DatabaseService,
+        rag_pipeline: RagPipeline
+    ):
+        self.document_service = document_service
+        self.database_service = database_service
+        self.rag_pipeline = rag_pipeline
+    
+    def index_file(self, file, file_name: str, file_hash: Optional[str] = None) -> IngestResult:
+        """
+        Indexa un archivo (o lo carga del almacén si ya estaba indexado)
+        
+        Args:
+            file: Objeto tipo archivo abierto en binario (o BytesIO)
+            file_name: Nombre del archivo, con extensión
+            file_hash: Hash ya calculado (p. ej. por DocumentService.spool_file)
+        
+        Returns:
+            IngestResult con el hash del documento
+        """
+        start = time.perf_counter()
+        try:
+            if file_hash is None:
+                file_hash = self.document_service.hash_file(file)
+            if self.database_service.load_collection(file_hash):
+                return IngestResult(file_name, "ya indexado", file_hash=file_hash,
+                                    seconds=time.perf_counter() - start)
+            
+            document = self.document_service.process_file(file, file_name, file_hash)
+            index_stats = self.database_service.create_collection(document)
+        except Exception as e:
+            print(f"Error indexando {file_name}: {e}")
+            return IngestResult(file_name, "error", error=f"{type(e).__name__}: {e}",
+                                seconds=time.perf_counter() - start)
+        
+        # La misma subida desde otro hilo terminó de indexarse mientras esta esperaba
+        if index_stats["already_indexed"]:
+            return IngestResult(file_name, "ya indexado", file_hash=document.file_hash,
+                                seconds=time.perf_counter() - start)
+        
+        return IngestResult(
+            file_name,
+            "indexado",
+            file_hash=document.file_hash,
+            chunks=index_stats["total_chunks"],
+            reused=index_stats["reused"],
+            seconds=time.perf_counter() - start
+        )
+    
+    def indexed_documents(self) -> List[dict]:
+        """
+        Documentos completos del almacén, construidos con la configuración
+        actual (una consulta a ChromaDB por colección)
+        """
+        return [doc for doc in self.database_service.list_documents() if doc["complete"] and doc["current"]]
+    
+    async def _indexed_documents_async(self) -> List[dict]:
+        # list_documents bloquea: se ejecuta en un hilo para no parar el bucle de eventos
+        return await asyncio.get_running_loop().run_in_executor(None, self.indexed_documents)
+    
+    def resolve_documents(
+        self,
+        identifiers: Optional[Iterable[str]] = None,
+        documents: Optional[List[dict]] = None
+    ) -> List[str]:
+        """
+        Convierte nombres de archivo o hashes en hashes de documentos indexados
+        
+        Args:
+            identifiers: Nombres, hashes completos o prefijos de hash
+                (None o vacío = todos los documentos del almacén)
+            documents: Resultado de indexed_documents() ya obtenido, para
+                no volver a consultar el almacén
+        
+        Returns:
+            Hashes de los documentos, sin repetir
+        
+        Raises:
+            ValueError: Si algún identificador no corresponde a ningún documento
+        """
+        if documents is None:
+            documents = self.indexed_documents()
+        if not identifiers:
+            return [doc["file_hash"] for doc in documents]
+        
+        hashes = []
+        for identifier in identifiers:
+            matches = [
+                doc for doc in documents
+                if doc["file_hash"].startswith(identifier) or doc["file_name"] == identifier
+            ]
+            if not matches:
+                raise ValueError(f"Documento no indexado: {identifier}")
+            # Con varias versiones del mismo archivo se usa la más reciente
+            latest = max(matches, key=lambda doc: doc["created_at"])
+            if latest["file_hash"] not in hashes:
+                hashes.append(latest["file_hash"])
+        return hashes
+    
+    async def ask(
+        self,
+        question: str,
+        documents: Optional[Sequence[str]] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> RagAnswer:
+        """
+        Responde una pregunta sobre los documentos indicados (sin historial)
+        
+        Args:
+            question: Pregunta
+            documents: Nombres o hashes (ver resolve_documents)
+            use_cache: False para no usar la caché de respuestas
+            timeout: Segundos por llamada al modelo
+        
+        Returns:
+            RagAnswer (los errores quedan en .error)
+        """
+        return await self._ask_resolved(question, documents, await self._indexed_documents_async(), use_cache, timeout)
+    
+    async def _ask_resolved(
+        self,
+        question: str,
+        identifiers: Optional[Sequence[str]],
+        indexed: List[dict],
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> RagAnswer:
+        # Como ask, pero con la lista de documentos del almacén ya obtenida
+        try:
+            file_hashes = self.resolve_documents(identifiers, indexed)
+        except ValueError as e:
+            return RagAnswer(question=question, error=str(e))
+        if not file_hashes:
+            return RagAnswer(question=question, error="No hay documentos indexados")
+        return await self.rag_pipeline.answer(question, file_hashes, use_cache=use_cache, timeout=timeout)
+    
+    async def ask_many(
+        self,
+        items: Sequence[dict],
+        documents: Optional[Sequence[str]] = None,
+        concurrency: int = 4,
+        use_cache: bool = True,
+        callback=None
+    ) -> List[RagAnswer]:
+        """
+        Responde muchas preguntas con como mucho `concurrency` en curso
+        
+        Args:
+            items: Diccionarios con "question" y, opcionalmente, "documents"
+            documents: Documentos por defecto para las preguntas que no los indican
+            concurrency: Preguntas en curso a la vez
+            use_cache: False para no usar la caché de respuestas
+            callback: Función opcional (índice, RagAnswer) llamada al terminar cada una
+        
+        Returns:
+            Un RagAnswer por pregunta, en el mismo orden
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        # El almacén se consulta una sola vez para todo el lote (fuera del bucle de
+        # eventos) y los documentos por defecto también se resuelven una sola vez
+        indexed = await self._indexed_documents_async()
+        try:
+            default_hashes = self.resolve_documents(documents, indexed)
+            default_error = None if default_hashes else "No hay documentos indexados"
+        except ValueError as e:
+            default_hashes, default_error = [], str(e)
+        
+        async def run(index: int, item: dict) -> RagAnswer:
+            async with semaphore:
+                if item.get("documents"):
+                    result = await self._ask_resolved(item["question"], item["documents"], indexed, use_cache)
+                elif default_error:
+                    result = RagAnswer(question=item["question"], error=default_error)
+                else:
+                    result = await self.rag_pipeline.answer(item["question"], default_hashes, use_cache=use_cache)
+            if callback is not None:
+                callback(index, result)
+            return result
+        
+        return await asyncio.gather(*(run(i, item) for i, item in enumerate(items)))
+
+
+def answer_to_dict(result: RagAnswer) -> dict:
+    """
+    Convierte un RagAnswer en un diccionario serializable a JSON
+    """
+    sources = []
+    if result.retrieval_result is not None:
+        retrieval = result.retrieval_result
+        for i, chunk in enumerate(retrieval.chunks):
+            sources.append({
+                "file_hash": retrieval.sources[i] if i < len(retrieval.sources) else None,
+                "page_number": retrieval.page_numbers[i] if i < len(retrieval.page_numbers) else None,
+                "text": chunk
+            })
+    return {
+        "question": result.question,
+        "answer": result.answer,
+        "error": result.error,
+        "from_cache": result.from_cache,
+        "attempts": result.attempts,
+        "timings": result.timings,
+        "sources": sources
+    }
@@ -0,0 +1,280 @@
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from models.document import ConversationMessage, RagAnswer, RetrievalResult
+from services.ai_service import AIService
+from services.answer_cache import AnswerCache
+from services.database_service import DatabaseService
+from services.memory_service import ConversationMemory
+from services.metrics_service import metrics
+from config.settings import settings
+
+
+class RagPipeline:
+    """
+    Pipeline RAG asíncrono: muchas preguntas a la vez desde un solo proceso
+    
+    Cada pregunta busca el contexto y formatea el historial en paralelo, y
+    después llama al modelo. Las partes bloqueantes (embeddings, ChromaDB,
+    Gemini) corren en un pool de hilos propio para no bloquear el bucle de
+    eventos. Como mucho LLM_MAX_CONCURRENCY llamadas al modelo van a la vez,
+    contando las que ya vencieron y siguen en su hilo; cada llamada tiene un
+    tiempo límite y se reintenta con espera exponencial si falla.
+    
+    Se puede probar sin API pasando a AIService un StubGenerativeModel.
+    """
+    
+    def __init__(
+        self,
+        database_service: DatabaseService,
+        ai_service: AIService,
+        answer_cache: Optional[AnswerCache] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None
+    ):
+        """
+        Args:
+            database_service: Búsqueda de contexto
+            ai_service: Construcción del prompt y llamadas al modelo
+            answer_cache: Caché de respuestas opcional
+            max_concurrency: Llamadas simultáneas al modelo (LLM_MAX_CONCURRENCY)
+            timeout: Segundos por llamada al modelo (LLM_TIMEOUT_SECONDS)
+            max_retries: Reintentos tras un fallo (LLM_MAX_RETRIES)
+            backoff: Espera antes del primer reintento; se duplica en cada uno
+        """
+        self.database_service = database_service
+        self.ai_service = ai_service
+        self.answer_cache = answer_cache
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.timeout = timeout if timeout is not None else settings.LLM_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.LLM_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else settings.LLM_RETRY_BACKOFF_SECONDS
+        
+        # Hilos para la búsqueda y el resto del trabajo bloqueante
+        self._executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="rag")
+        # Las llamadas al modelo van en su propio pool: una llamada que vence y
+        # sigue en su hilo no quita hilos a la búsqueda
+        self._llm_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="rag-llm")
+        # Un hueco por llamada al modelo; se libera cuando la llamada termina de
+        # verdad, no cuando se deja de esperarla (como en RerankService)
+        self._llm_slots = threading.BoundedSemaphore(self.max_concurrency)
+        # Un semáforo por bucle de eventos para la cola de espera (asyncio.Semaphore pertenece a un bucle)
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+    
+    async def _run(self, function, *args):
+        """
+        Ejecuta una función bloqueante en el pool de hilos del pipeline
+        
+        Se ejecuta en una copia del contexto actual para que las etapas que
+        mida la función vayan a la traza de la pregunta en curso.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, function, *args))
+    
+    async def _acquire_llm_slot(self) -> None:
+        # Espera sin bloquear el bucle de eventos a que quede un hueco libre
+        delay = 0.005
+        while not self._llm_slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+    
+    async def _call_llm(self, prompt: str, timeout: Optional[float]) -> str:
+        """
+        Una llamada al modelo en el pool de llamadas, con tiempo límite
+        
+        Si vence el tiempo, la llamada sigue en su hilo (no se puede
+        interrumpir) y conserva su hueco hasta que termina.
+        """
+        await self._acquire_llm_slot()
+        context = contextvars.copy_context()
+        try:
+            future = self._llm_executor.submit(context.run, self.ai_service.generate_from_prompt, prompt)
+        except BaseException:
+            self._llm_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._llm_slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout or None)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+    
+    async def prepare(
+        self,
+        question: str,
+        file_hashes: Sequence[str],
+        history: Sequence[ConversationMessage] = (),
+        memory: Optional[ConversationMemory] = None,
+        timings: Optional[dict] = None
+    ) -> Tuple[str, RetrievalResult]:
+        """
+        Busca el contexto y formatea el historial a la vez, y construye el prompt
+        
+        Args:
+            question: Pregunta
+            file_hashes: Documentos a consultar
+            history: Historial de la conversación
+            memory: Memoria acotada de la conversación
+            timings: Diccionario opcional donde anotar los segundos de cada etapa
+        
+        Returns:
+            (prompt, contexto recuperado)
+        """
+        timings = timings if timings is not None else {}
+        start = time.perf_counter()
+        
+        retrieval = self._run(self.database_service.retrieve_context, question, None, list(file_hashes))
+        history_text = self._run(self.ai_service.format_history, list(history), memory)
+        retrieval_result, history_text = await asyncio.gather(retrieval, history_text)
+        timings["retrieval"] = time.perf_counter() - start
+        timings.update(retrieval_result.timings)
+        
+        prompt = self.ai_service.build_prompt(
+            retrieval_result.get_context_text(), question, history_text, memory
+        )
+        timings["prepare"] = time.perf_counter() - start
+        return prompt, retrieval_result
+    
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> Tuple[str, int]:
+        """
+        Llama al modelo con límite de concurrencia, tiempo límite y reintentos
+        
+        Args:
+            prompt: Prompt completo
+            timeout: Segundos por intento (None = el del pipeline)
+        
+        Returns:
+            (respuesta, número de intentos)
+        
+        Raises:
+            asyncio.TimeoutError o la excepción del modelo si fallan todos los intentos
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self._semaphore():
+                    # Al vencer el tiempo se abandona el resultado y se reintenta
+                    # cuando haya un hueco libre
+                    answer = await self._call_llm(prompt, timeout)
+                return answer, attempt
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.increment("llm_timeouts_total")
+                if attempt > self.max_retries:
+                    raise
+                metrics.increment("llm_retries_total")
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                print(f"Fallo del modelo ({type(e).__name__}: {e}); reintento {attempt} en {delay:.1f}s")
+                await asyncio.sleep(delay)
+    
+    async def answer(
+        self,
+        question: str,
+        file_hashes: Sequence[str],
+        history: Sequence[ConversationMessage] = (),
+        memory: Optional[ConversationMemory] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> RagAnswer:
+        """
+        Responde una pregunta completa: caché, contexto, prompt y modelo
+        
+        Los errores no se lanzan: quedan en RagAnswer.error, así una pregunta
+        que falla no detiene a las demás. La cancelación sí se propaga.
+        
+        Args:
+            question: Pregunta
+            file_hashes: Documentos a consultar
+            history: Historial de la conversación
+            memory: Memoria acotada de la conversación
+            use_cache: False para no usar la caché de respuestas
+            timeout: Segundos por llamada al modelo (None = el del pipeline)
+        
+        Returns:
+            RagAnswer con la respuesta, el contexto y los tiempos
+        """
+        result = RagAnswer(question=question)
+        start = time.perf_counter()
+        try:
+            cacheable = self.answer_cache is not None and use_cache and self.answer_cache.is_cacheable(
+                question, list(history)
+            )
+            query_vector = None
+            if cacheable:
+                query_vector = await self._run(self.database_service.embedding_service.encode_query, question)
+                cached = self.answer_cache.lookup(file_hashes, query_vector, question)
+                if cached is not None:
+                    result.answer = cached["answer"]
+                    result.retrieval_result = cached["retrieval_result"]
+                    result.from_cache = True
+                    return result
+            elif self.answer_cache is not None:
+                self.answer_cache.record_bypass()
+            
+            prompt, result.retrieval_result = await self.prepare(
+                question, file_hashes, history, memory, result.timings
+            )
+            
+            generation_start = time.perf_counter()
+            result.answer, result.attempts = await self.generate(prompt, timeout)
+            # El span generate_response de cada intento lo registra AIService.generate_from_prompt
+            result.timings["generation"] = time.perf_counter() - generation_start
+            
+            if cacheable and result.answer:
+                self.answer_cache.put(file_hashes, query_vector, question, result.answer, result.retrieval_result)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            result.error = "Tiempo de espera agotado"
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        finally:
+            result.timings["total"] = time.perf_counter() - start
+        return result
+    
+    async def answer_many(
+        self,
+        questions: Sequence[str],
+        file_hashes: Sequence[str],
+        use_cache: bool = True
+    ) -> List[RagAnswer]:
+        """
+        Responde varias preguntas independientes (sin historial) a la vez
+        
+        Returns:
+            Un RagAnswer por pregunta, en el mismo orden
+        """
+        return await asyncio.gather(*(
+            self.answer(question, file_hashes, use_cache=use_cache) for question in questions
+        ))
+    
+    def close(self) -> None:
+        """
+        Libera los pools de hilos (las llamadas en curso terminan en segundo plano)
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._llm_executor.shutdown(wait=False, cancel_futures=True)
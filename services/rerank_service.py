@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List, Optional
+
+import numpy as np
+
+from models.document import RetrievalResult
+from services.metrics_service import metrics
+from config.settings import settings
+
+
+class RerankService:
+    """
+    Reordena los candidatos de la búsqueda con un cross-encoder local
+    
+    El cross-encoder lee pregunta y chunk juntos, así que ordena mucho mejor
+    que la distancia entre embeddings, pero es más lento: solo se aplica a
+    unos pocos candidatos y todos los pares se puntúan en una sola llamada.
+    Si la llamada no termina dentro de RERANK_TIME_BUDGET_MS, o si todos los
+    hilos siguen ocupados con llamadas anteriores, se usa el orden original
+    de la búsqueda.
+    """
+    
+    def __init__(self, model_name: Optional[str] = None, time_budget_ms: Optional[float] = None):
+        """
+        Args:
+            model_name: Modelo de sentence-transformers (RERANK_MODEL_NAME)
+            time_budget_ms: Tiempo máximo por llamada (RERANK_TIME_BUDGET_MS, 0 = sin límite)
+        """
+        self.model_name = model_name or settings.RERANK_MODEL_NAME
+        self.time_budget_ms = time_budget_ms if time_budget_ms is not None else settings.RERANK_TIME_BUDGET_MS
+        self._model = None
+        self._model_lock = threading.Lock()
+        # La puntuación corre en otro hilo para poder dejar de esperarla
+        self._executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="rerank")
+        # Un hueco por hilo: no se encolan llamadas detrás de otras que ya van tarde
+        self._slots = threading.BoundedSemaphore(settings.RETRIEVAL_WORKERS)
+    
+    @property
+    def model(self):
+        """
+        Cross-encoder, cargado la primera vez que se usa
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    
+                    print(f"Cargando cross-encoder: {self.model_name}")
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+    
+    def rerank(self, queries: List[str], results: List[RetrievalResult], top_k: int) -> List[RetrievalResult]:
+        """
+        Reordena los candidatos de cada pregunta y se queda con los top_k mejores
+        
+        Args:
+            queries: Preguntas
+            results: Candidatos de cada pregunta (mismo orden que queries)
+            top_k: Chunks a devolver por pregunta
+        
+        Returns:
+            Un RetrievalResult por pregunta con los chunks reordenados y, en
+            timings, rerank_ms, rerank_candidates y rerank_fallback
+        """
+        pairs = [(query, chunk) for query, result in zip(queries, results) for chunk in result.chunks]
+        model = self.model if pairs else None  # La primera carga no cuenta para el plazo
+        start = time.perf_counter()
+        scores = None
+        if pairs and not self._slots.acquire(blocking=False):
+            print("Reordenación sin hilos libres: se usa el orden de la búsqueda")
+            metrics.increment("rerank_fallback_total", reason="busy")
+        elif pairs:
+            future = self._executor.submit(
+                model.predict, pairs, batch_size=len(pairs), convert_to_numpy=True, show_progress_bar=False
+            )
+            # El hueco se libera cuando la llamada termina de verdad, no cuando se deja de esperar
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                scores = future.result(timeout=self.time_budget_ms / 1000 if self.time_budget_ms else None)
+            except TimeoutError:
+                # Si aún no había empezado no llega a ejecutarse; si ya corre, su resultado no se usa
+                future.cancel()
+                print(f"Reordenación fuera de plazo ({self.time_budget_ms:.0f} ms): se usa el orden de la búsqueda")
+                metrics.increment("rerank_fallback_total", reason="timeout")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        reranked = []
+        offset = 0
+        for result in results:
+            n = len(result.chunks)
+            if scores is None:
+                order = list(range(min(top_k, n)))
+                result_scores = result.scores[:top_k]
+            else:
+                query_scores = np.asarray(scores[offset:offset + n], dtype=np.float32)
+                order = np.argsort(-query_scores, kind="stable")[:top_k].tolist()
+                result_scores = [float(query_scores[i]) for i in order]
+            offset += n
+            
+            reranked.append(RetrievalResult(
+                chunks=[result.chunks[i] for i in order],
+                chunk_ids=[result.chunk_ids[i] for i in order],
+                distances=[result.distances[i] for i in order],
+                sources=[result.sources[i] for i in order] if result.sources else [],
+                page_numbers=[result.page_numbers[i] for i in order] if result.page_numbers else [],
+                scores=result_scores,
+                timings={
+                    **result.timings,
+                    "rerank_ms": elapsed_ms,
+                    "rerank_candidates": n,
+                    # Sin candidatos no hay nada que reordenar: no es un fallo
+                    "rerank_fallback": scores is None and bool(pairs)
+                }
+            ))
+        return reranked
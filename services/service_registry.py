@@ -0,0 +1,201 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    from services.document_service import DocumentService
+    from services.embedding_service import EmbeddingService
+    from services.database_service import DatabaseService
+    from services.rerank_service import RerankService
+    from services.ai_service import AIService
+    from services.ingest_service import IngestService
+    from services.answer_cache import AnswerCache
+    from services.rag_pipeline import RagPipeline
+    from services.qa_service import QAService
+
+
+class ServiceRegistry:
+    """
+    Registro de servicios compartidos por todo el proceso
+    
+    Streamlit vuelve a ejecutar main.py en cada interacción, pero los módulos
+    solo se importan una vez. Este registro vive a nivel de módulo y carga cada
+    recurso pesado (modelo de embeddings, cliente de ChromaDB, Gemini) una sola
+    vez, entregando la misma instancia a todas las sesiones.
+    
+    Cada servicio se importa y se crea la primera vez que se pide, así la
+    primera página se pinta sin esperar a torch, ChromaDB ni Gemini.
+    """
+    
+    def __init__(self):
+        """
+        Inicializa el registro vacío
+        """
+        self._services: Dict[str, Any] = {}
+        self._load_timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._service_locks: Dict[str, threading.Lock] = {}
+        self._startup_timings: Dict[str, float] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+    
+    def get_or_create(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Devuelve el servicio registrado con ese nombre, creándolo si no existe
+        
+        Cada servicio tiene su propio lock, así dos sesiones que piden el mismo
+        servicio a la vez no lo cargan dos veces, y un servicio puede depender
+        de otro sin bloquearse.
+        
+        Args:
+            name: Nombre del servicio
+            factory: Función que construye el servicio
+        
+        Returns:
+            Instancia compartida del servicio
+        """
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        
+        with self._lock:
+            service_lock = self._service_locks.setdefault(name, threading.Lock())
+        
+        with service_lock:
+            service = self._services.get(name)
+            if service is None:
+                start = time.perf_counter()
+                service = factory()
+                elapsed = time.perf_counter() - start
+                self._load_timings[name] = elapsed
+                self._services[name] = service
+                print(f"Servicio '{name}' cargado en {elapsed:.2f}s")
+        
+        return service
+    
+    def is_loaded(self, name: str) -> bool:
+        """
+        Indica si el servicio ya está creado (sin crearlo)
+        """
+        return name in self._services
+    
+    def get_document_service(self) -> "DocumentService":
+        from services.document_service import DocumentService
+        
+        return self.get_or_create("document", DocumentService)
+    
+    def get_embedding_service(self) -> "EmbeddingService":
+        from services.embedding_service import EmbeddingService
+        
+        return self.get_or_create("embedding", EmbeddingService)
+    
+    def get_database_service(self) -> "DatabaseService":
+        from services.database_service import DatabaseService
+        
+        return self.get_or_create(
+            "database",
+            lambda: DatabaseService(
+                self.get_embedding_service(),
+                reranker=self.get_rerank_service() if settings.RERANK_ENABLED else None
+            )
+        )
+    
+    def get_rerank_service(self) -> "RerankService":
+        from services.rerank_service import RerankService
+        
+        return self.get_or_create("rerank", RerankService)
+    
+    def get_ai_service(self) -> "AIService":
+        from services.ai_service import AIService
+        
+        return self.get_or_create("ai", AIService)
+    
+    def get_ingest_service(self) -> "IngestService":
+        from services.ingest_service import IngestService
+        
+        return self.get_or_create(
+            "ingest",
+            lambda: IngestService(self.get_document_service(), self.get_database_service())
+        )
+    
+    def get_answer_cache(self) -> "AnswerCache":
+        from services.answer_cache import AnswerCache
+        
+        return self.get_or_create(
+            "answer_cache",
+            lambda: AnswerCache(
+                settings.EMBEDDING_MODEL_NAME,
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+                max_entries=settings.ANSWER_CACHE_SIZE,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                path=settings.ANSWER_CACHE_PATH or None
+            )
+        )
+    
+    def get_rag_pipeline(self) -> "RagPipeline":
+        from services.rag_pipeline import RagPipeline
+        
+        return self.get_or_create(
+            "rag_pipeline",
+            lambda: RagPipeline(self.get_database_service(), self.get_ai_service(), self.get_answer_cache())
+        )
+    
+    def get_qa_service(self) -> "QAService":
+        from services.qa_service import QAService
+        
+        return self.get_or_create(
+            "qa",
+            lambda: QAService(self.get_document_service(), self.get_database_service(), self.get_rag_pipeline())
+        )
+    
+    def get_load_timings(self) -> Dict[str, float]:
+        """
+        Obtiene el tiempo de carga (en segundos) de cada servicio ya creado
+        
+        Returns:
+            Diccionario nombre -> segundos
+        """
+        return dict(self._load_timings)
+
+    def start_warmup(self) -> None:
+        """
+        Carga en un hilo de fondo el modelo de embeddings, ChromaDB y Gemini
+        
+        Solo la primera llamada del proceso lanza el hilo. Si una sesión pide
+        un servicio que se está cargando, espera a esa carga (el lock de cada
+        servicio) en lugar de repetirla.
+        """
+        with self._lock:
+            if self._warmup_thread is not None:
+                return
+            self._warmup_thread = threading.Thread(target=self._warmup, name="warmup", daemon=True)
+            self._warmup_thread.start()
+    
+    def _warmup(self) -> None:
+        try:
+            # El pipeline arrastra la base de datos (y el modelo), Gemini y la caché de respuestas
+            self.get_rag_pipeline()
+        except Exception as e:
+            # Si falla, el servicio se vuelve a intentar cargar cuando se use
+            print(f"Error precargando los servicios: {e}")
+    
+    def record_startup_timing(self, name: str, seconds: float) -> None:
+        """
+        Guarda un tiempo del arranque del proceso (solo el primero de cada nombre)
+        """
+        with self._lock:
+            self._startup_timings.setdefault(name, seconds)
+    
+    def get_startup_timings(self) -> Dict[str, float]:
+        """
+        Tiempos del arranque del proceso (p. ej. la primera pintura)
+        
+        Returns:
+            Diccionario nombre -> segundos
+        """
+        return dict(self._startup_timings)
+
+
+# Instancia global del registro (una por proceso)
+registry = ServiceRegistry()
@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Iterator, List, Optional
+
+
+class StubResponse:
+    """
+    Respuesta falsa con la misma forma que la de Gemini (atributo .text)
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """
+    Modelo local que imita genai.GenerativeModel sin llamar a la API
+
+    Sirve para pruebas, benchmarks y para ejecutar la aplicación sin
+    GOOGLE_API_KEY. Responde con un texto fijo (por defecto, uno que indica
+    la longitud del prompt recibido) y puede simular la latencia del primer
+    token y de cada fragmento, y fallos transitorios.
+    """
+
+    def __init__(
+        self,
+        answer: Optional[str] = None,
+        first_token_delay: float = 0.0,
+        chunk_delay: float = 0.0,
+        chunk_size: int = 20,
+        failures: int = 0
+    ):
+        """
+        Args:
+            answer: Texto a devolver (None = "Respuesta de prueba (N caracteres de prompt)")
+            first_token_delay: Segundos antes del primer fragmento
+            chunk_delay: Segundos entre fragmentos
+            chunk_size: Caracteres por fragmento en modo streaming
+            failures: Número de llamadas iniciales que fallan (para probar reintentos)
+        """
+        self.answer = answer
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.failures = failures
+        self.prompts: List[str] = []  # Prompts recibidos (para inspeccionarlos)
+        self._lock = threading.Lock()
+
+    def _answer_for(self, prompt: str) -> str:
+        if self.answer is not None:
+            return self.answer
+        return f"Respuesta de prueba ({len(prompt)} caracteres de prompt)"
+
+    def _stream(self, text: str) -> Iterator[StubResponse]:
+        time.sleep(self.first_token_delay)
+        for start in range(0, len(text), self.chunk_size):
+            if start > 0:
+                time.sleep(self.chunk_delay)
+            yield StubResponse(text[start:start + self.chunk_size])
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        """
+        Misma firma que GenerativeModel.generate_content
+
+        Args:
+            prompt: Prompt completo
+            stream: Si es True devuelve un iterador de fragmentos
+
+        Returns:
+            StubResponse, o iterador de StubResponse si stream=True
+        """
+        with self._lock:
+            self.prompts.append(prompt)
+            failing = self.failures > 0
+            self.failures -= failing
+        if failing:
+            raise RuntimeError("Fallo simulado del modelo")
+        text = self._answer_for(prompt)
+
+        if stream:
+            return self._stream(text)
+
+        time.sleep(self.first_token_delay)
+        return StubResponse(text)
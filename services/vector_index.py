@@ -0,0 +1,145 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Normaliza cada fila a norma 1 (las filas nulas se dejan a cero)
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyVectorIndex:
+    """
+    Índice vectorial exacto en memoria (alternativa a ChromaDB)
+    
+    Guarda los embeddings como una matriz float32 (normalizada si la métrica
+    es coseno). Una búsqueda es un producto matriz-vector más argpartition,
+    que para unos miles de chunks es más rápido que una consulta a ChromaDB.
+    """
+    
+    METRICS = ("cosine", "dot")
+    
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: List[str],
+        texts: List[str],
+        metric: str = "cosine",
+        pages: Optional[List[Optional[int]]] = None
+    ):
+        """
+        Args:
+            vectors: Matriz (n, dim) con los embeddings
+            ids: ID de cada fila
+            texts: Contenido de cada fila
+            metric: "cosine" o "dot"
+            pages: Página de cada fila (opcional)
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Métrica no soportada: {metric}")
+        if len(vectors) != len(ids) or len(ids) != len(texts):
+            raise ValueError("vectors, ids y texts deben tener la misma longitud")
+        
+        self.metric = metric
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.pages = list(pages) if pages is not None else [None] * len(self.ids)
+        
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if metric == "cosine":
+            self.vectors = normalize_rows(self.vectors)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los k vectores más cercanos a cada consulta
+        
+        Args:
+            queries: Matriz (q, dim) o vector (dim,) de consultas
+            k: Número de resultados por consulta
+        
+        Returns:
+            (índices (q, k), distancias (q, k)), ordenados de más a menos cercano.
+            La distancia es 1 - coseno, o -producto escalar para "dot".
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if self.metric == "cosine":
+            queries = normalize_rows(queries)
+        
+        k = min(k, len(self))
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        
+        scores = queries @ self.vectors.T
+        
+        # argpartition deja los k mejores (sin ordenar) en O(n); luego se ordenan solo esos
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        
+        distances = 1.0 - top_scores if self.metric == "cosine" else -top_scores
+        return indices, distances
+    
+    def save(self, path: str) -> None:
+        """
+        Guarda el índice: la matriz en `path` (.npy) y los ids, textos,
+        páginas y métrica en un .json al lado
+        
+        Args:
+            path: Ruta del fichero .npy
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.save(path, np.asarray(self.vectors))
+        with open(self._meta_path(path), "w", encoding="utf-8") as f:
+            json.dump({"metric": self.metric, "ids": self.ids, "texts": self.texts, "pages": self.pages}, f)
+    
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Optional["NumpyVectorIndex"]:
+        """
+        Carga un índice guardado con save()
+        
+        Args:
+            path: Ruta del fichero .npy
+            mmap: Si es True la matriz se mapea en memoria en lugar de leerse
+        
+        Returns:
+            El índice, o None si no existe
+        """
+        meta_path = cls._meta_path(path)
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.load(path, mmap_mode="r" if mmap else None)
+        
+        # La matriz guardada ya está normalizada: se usa tal cual, sin copiarla
+        index = cls.__new__(cls)
+        index.metric = meta["metric"]
+        index.ids = meta["ids"]
+        index.texts = meta["texts"]
+        index.pages = meta.get("pages") or [None] * len(index.ids)
+        index.vectors = vectors
+        return index
+    
+    @staticmethod
+    def _meta_path(path: str) -> str:
+        return os.path.splitext(path)[0] + ".json"